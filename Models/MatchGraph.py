@@ -0,0 +1,10 @@
+from sqlalchemy import Column, String, Integer
+from Models.Base import Base
+
+class MatchGraph(Base):
+    __tablename__ = "match_graphs"
+
+    # one row per (match, team) graph stored in match_node_data
+    match_id             = Column(Integer, primary_key=True)
+    team_id              = Column(Integer, primary_key=True)
+    fingerprint          = Column(String)
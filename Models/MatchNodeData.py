@@ -0,0 +1,14 @@
+from sqlalchemy import Column, Float, Integer
+from Models.Base import Base
+from metrics import SCORE_COLUMNS
+
+class MatchNodeData(Base):
+    __tablename__ = "match_node_data"
+
+    match_id             = Column(Integer, primary_key=True)
+    team_id              = Column(Integer, primary_key=True)
+    player_id            = Column(Integer, primary_key=True)
+
+# one score column per registered metric (score_betweenness, score_pagerank, score_degree, ...)
+for column in SCORE_COLUMNS:
+    setattr(MatchNodeData, column, Column(Float))
@@ -1,11 +1,13 @@
 from sqlalchemy import Column, String, Float , Integer
 from Models.Base import Base
+from metrics import SCORE_COLUMNS
 
 class NodeData(Base):
     __tablename__ = "node_data"
 
     player_id            = Column(Integer, primary_key=True)
     games                = Column(Integer)
-    score_betweenness    = Column(Float)
-    score_pagerank       = Column(Float)
-    score_degree         = Column(Float)
+
+# score sums of every registered metric, same columns as match_node_data
+for column in SCORE_COLUMNS:
+    setattr(NodeData, column, Column(Float))
@@ -1,5 +1,6 @@
 from sqlalchemy import Column, String, Integer
 from Models.Base import Base
+from event_statistics import EVENT_STATISTICS
 
 class Player(Base):
     __tablename__ = "players"
@@ -16,10 +17,6 @@ class Player(Base):
     draws = Column(Integer)
     losses = Column(Integer)
 
-    total_passes = Column(Integer)
-    completed_passes = Column(Integer)
-    goals = Column(Integer)
-    assists = Column(Integer)
-    fouls_committed = Column(Integer)
-    yellow_cards = Column(Integer)
-    red_cards = Column(Integer)
+# one column per event statistic (total_passes, completed_passes, assists, ...)
+for column in EVENT_STATISTICS:
+    setattr(Player, column, Column(Integer))
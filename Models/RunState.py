@@ -0,0 +1,10 @@
+from sqlalchemy import Column, String, Integer
+from Models.Base import Base
+
+class RunState(Base):
+    __tablename__ = "run_state"
+
+    # named flags kept across runs, e.g. node_data_stale: set in the same transaction
+    # as the graph rows, cleared in the one that derives node_data again
+    name                 = Column(String, primary_key=True)
+    value                = Column(Integer)
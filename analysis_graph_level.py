@@ -1,14 +1,17 @@
 import json
 import os
-import random
-import networkx as nx
-import pandas as pd
+
+from pass_network import as_pass_network
+from clustering import batched_average_clustering
+from data_paths import events_path, matches_path
+from graph_store import GraphStore
 
 
-DATA_PATH = "Data"
 RESULTS_PATH = "Results"
 
-N_MATCHES = 15   # small sample of matches
+# False: clustering of the undirected graphs (nx.average_clustering(G.to_undirected(), weight="weight"))
+# True: directed weighted clustering of the passing networks, without the undirected conversion
+CLUSTERING_DIRECTED = False
 
 COMPETITIONS = [
     "Italy",
@@ -21,44 +24,61 @@ COMPETITIONS = [
 ]
 
 
-def build_team_graph(events, match_id, team_id):
-    # Build directed weighted passing graph for one team in one match
-    df = pd.DataFrame(events)
+def graphs_metrics(graphs, directed=CLUSTERING_DIRECTED):
+    # Graph-level metrics of many graphs (PassNetwork or networkx) at once:
+    # one (density, clustering) pair per graph, (None, None) for graphs with less than 2 nodes.
+    # Clusterings come from the batched clustering engine
+    networks = [as_pass_network(G) for G in graphs]
+    clusterings = batched_average_clustering(networks, directed=directed)
 
-    df = df[
-        (df["matchId"] == match_id) &
-        (df["teamId"] == team_id) &
-        (df["eventName"] == "Pass")
+    return [
+        (network.density(), clustering) if len(network) >= 2 else (None, None)
+        for network, clustering in zip(networks, clusterings)
     ]
 
-    G = nx.DiGraph()
 
-    for i in range(len(df) - 1):
-        passer = df.iloc[i]["playerId"]
-        receiver = df.iloc[i + 1]["playerId"]
+def graph_metrics(G):
+    # Compute graph-level metrics (G can be a PassNetwork or a networkx graph)
+    return graphs_metrics([G])[0]
 
-        if G.has_edge(passer, receiver):
-            G[passer][receiver]["weight"] += 1
-        else:
-            G.add_edge(passer, receiver, weight=1)
 
-    return G
+def competition_graph_metrics(competition):
+    # Average density and clustering of every team graph of the competition
+    with open(matches_path(competition), encoding="utf-8") as f:
+        matches = json.load(f)
 
+    # all the team graphs of the competition, read from the graph store
+    # (built from the events the first time)
+    graph_store = GraphStore.from_json(events_path(competition))
 
-def graph_metrics(G):
-    # Compute graph-level metrics
-    if G.number_of_nodes() < 2:
-        return None, None
+    # every team of every match, in the order of the matches file
+    # (a team without passes gets an empty network)
+    networks = graph_store.networks(
+        (match["wyId"], team_id)
+        for match in matches
+        for team_id in match["teamsData"].keys()
+    )
 
-    density = nx.density(G)
+    metrics = [
+        (density, clustering)
+        for density, clustering in graphs_metrics(networks)
+        if density is not None
+    ]
+    densities = [density for density, clustering in metrics]
+    clusterings = [clustering for density, clustering in metrics]
+
+    return {
+        "matches": len(matches),
+        "avg_density": sum(densities) / len(densities),
+        "avg_clustering": sum(clusterings) / len(clusterings)
+    }
 
-    # clustering works on undirected graphs
-    clustering = nx.average_clustering(
-        G.to_undirected(),
-        weight="weight"
-    )
 
-    return density, clustering
+def write_graph_summary(out, competition, summary):
+    out.write(f"Competition: {competition}\n")
+    out.write(f"Matches analysed: {summary['matches']}\n")
+    out.write(f"Average network density: {summary['avg_density']:.4f}\n")
+    out.write(f"Average clustering coefficient: {summary['avg_clustering']:.4f}\n\n")
 
 
 def main():
@@ -70,45 +90,10 @@ def main():
 
         for competition in COMPETITIONS:
             print(f"Processing {competition}...")
-
-            # Load data
-            with open(f"{DATA_PATH}/events/events_{competition}.json", encoding="utf-8") as f:
-                events = json.load(f)
-
-            with open(f"{DATA_PATH}/matches/matches_{competition}.json", encoding="utf-8") as f:
-                matches = json.load(f)
-
-            sampled_matches = random.sample(
-                matches,
-                min(N_MATCHES, len(matches))
-            )
-
-            densities = []
-            clusterings = []
-
-            for match in sampled_matches:
-                match_id = match["wyId"]
-                teams = list(match["teamsData"].keys())
-
-                for team_id in teams:
-                    G = build_team_graph(events, match_id, int(team_id))
-                    density, clustering = graph_metrics(G)
-
-                    if density is not None:
-                        densities.append(density)
-                        clusterings.append(clustering)
-
-            avg_density = sum(densities) / len(densities)
-            avg_clustering = sum(clusterings) / len(clusterings)
-
-            out.write(f"Competition: {competition}\n")
-            out.write(f"Matches sampled: {len(sampled_matches)}\n")
-            out.write(f"Average network density: {avg_density:.4f}\n")
-            out.write(f"Average clustering coefficient: {avg_clustering:.4f}\n\n")
+            write_graph_summary(out, competition, competition_graph_metrics(competition))
 
     print(f"Graph-level summary written to {output_path}")
 
 
-
 if __name__ == "__main__":
     main()
@@ -6,6 +6,8 @@ import sys
 import os
 from contextlib import contextmanager
 
+from metrics import METRIC_NAMES, METRICS, score_column
+
 
 
 # Print output to file Results/results_{competition}.txt
@@ -38,6 +40,16 @@ def filter_reliable_players(df, min_games=10):
 
 # ====================================================== CENTRALITIES ===========================================================
 
+# avg_{metric} column -> plot label, for the registered metrics (see metrics.py) stored in node_data.
+# Databases written before a metric was registered have no score column for it (the analysis reads
+# them as they are) or only NULL values: the metric is left out of the analysis
+def centrality_labels(node_data):
+    return {
+        f"avg_{name}": f"Average {METRICS[name]['label']}"
+        for name in METRIC_NAMES
+        if score_column(name) in node_data and node_data[score_column(name)].notna().any()
+    }
+
 # MERGE AND NORMALIZE CENTRALITIES
 def build_analysis_dataframe(players, node_data):
     # put same key type for merge
@@ -52,9 +64,9 @@ def build_analysis_dataframe(players, node_data):
     )
 
     # normalize centralities per game
-    df["avg_degree"] = df["score_degree"] / df["games"]
-    df["avg_betweenness"] = df["score_betweenness"] / df["games"]
-    df["avg_pagerank"] = df["score_pagerank"] / df["games"]
+    for metric in centrality_labels(node_data):
+        name = metric.removeprefix("avg_")
+        df[metric] = df[score_column(name)] / df["games"]
 
     return df
 
@@ -137,20 +149,14 @@ def plot_scatter(
 
 
 # RECOG vs CENTR PLOT
-def plot_recognition_vs_centrality(df, competition):
+def plot_recognition_vs_centrality(df, competition, labels):
     out_dir = f"Graphs/Graph_{competition}"
     os.makedirs(out_dir, exist_ok=True)
 
     df = df.copy()
     df["recognition"] = df["goals"] + df["assists"]
 
-    metrics = {
-        "avg_degree": "Average Degree Centrality",
-        "avg_betweenness": "Average Betweenness Centrality",
-        "avg_pagerank": "Average PageRank Centrality"
-    }
-
-    for metric, label in metrics.items():
+    for metric, label in labels.items():
         plot_scatter(
             df=df,
             x_col=metric,
@@ -162,20 +168,14 @@ def plot_recognition_vs_centrality(df, competition):
         )
 
 # TEAM SUCCESS vs CENTR PLOT
-def plot_success_vs_centrality(df, competition):
+def plot_success_vs_centrality(df, competition, labels):
     out_dir = f"Graphs/Graph_{competition}"
     os.makedirs(out_dir, exist_ok=True)
 
     df = df.copy()
     df["win_rate"] = df["wins"] / df["total_matches"]
 
-    metrics = {
-        "avg_degree": "Average Degree Centrality",
-        "avg_betweenness": "Average Betweenness Centrality",
-        "avg_pagerank": "Average PageRank Centrality"
-    }
-
-    for metric, label in metrics.items():
+    for metric, label in labels.items():
         plot_scatter(
             df=df,
             x_col=metric,
@@ -190,42 +190,53 @@ def plot_success_vs_centrality(df, competition):
 
 
 # ======================================================= MAIN ==============================================================
-def main():
-    competition = "European_Championship"
 
+# COMPETITION TO ANALYSE (when run as a script)
+COMPETITION = "European_Championship"
+
+# FOR EU CUP AND WORLD CUP SET MIN GAMES TO 5, OR ELSE OUTPUT IS EMPTY
+MIN_GAMES = 10
+
+
+# Write the results file and the plots of one competition
+def run_analysis(competition, min_games=MIN_GAMES):
     # output file
     output_path = f"Results/results_{competition}.txt"
-
-    # FOR EU CUP AND WORLD CUP SET MIN GAMES TO 5, OR ELSE OUTPUT IS EMPTY
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
 
     players, node_data = load_db(competition)
     df = build_analysis_dataframe(players, node_data)
-    df = filter_reliable_players(df, min_games=10)
+    labels = centrality_labels(node_data)
+    df = filter_reliable_players(df, min_games=min_games)
 
     with redirect_stdout_to_file(output_path):    
-        rank_players(df, "avg_degree")
-        rank_players(df, "avg_betweenness")
-        rank_players(df, "avg_pagerank")
+        for m in labels:
+            rank_players(df, m)
 
         # avg degree consistency 
         centrality_consistency(df, metric="avg_degree", min_games=20)  # higher games threshold (20)
 
         # correlations
-        metrics = ["avg_degree", "avg_betweenness", "avg_pagerank"]
         print("\n--- Individual recognition vs centrality ---")
-        for m in metrics:
+        for m in labels:
             recognition_vs_centrality(df, m)
 
         print("\n--- Team success vs centrality ---")
-        for m in metrics:
+        for m in labels:
             success_vs_centrality(df, m)
 
     print(f"Results written to {output_path}")
 
     # plots
-    plot_recognition_vs_centrality(df, competition)
-    plot_success_vs_centrality(df, competition)
+    plot_recognition_vs_centrality(df, competition, labels)
+    plot_success_vs_centrality(df, competition, labels)
+
+    return output_path
+
+
+def main():
+    run_analysis(COMPETITION)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
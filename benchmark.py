@@ -0,0 +1,309 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+
+# Benchmark of the pipeline stages on synthetic competitions (see synthetic_data.py).
+#
+#   python benchmark.py run --matches 38 380 --output Results/benchmark.json
+#   python benchmark.py compare Results/benchmark_old.json Results/benchmark.json
+#
+# Every scale runs in a temporary directory laid out like the project (Data/, Databases/).
+# The stages are timed (best of the repeats) without tracing, then run once more under
+# tracemalloc for their peak memory, which would otherwise slow them down several times.
+# compare flags the stages that became slower (or bigger) than the threshold.
+
+BENCHMARK_MATCHES = [38, 380]
+BENCHMARK_COMPETITION = "Synthetic"
+BENCHMARK_OUTPUT_PATH = "Results/benchmark.json"
+
+# Stages in the order they run
+STAGES = [
+    "generate",       # write the synthetic json files (not a pipeline stage, for reference)
+    "parse",          # events json -> columnar cache
+    "graph_store",    # edge lists of every (match, team) saved in the graph store
+    "graph_build",    # one PassNetwork per (match, team), read from the store
+    "metrics",        # every registered player metric (see metrics.py), followed by
+                      # one stage per intermediate and metric (adjacency, distances, betweenness, pagerank...)
+    "db_write",       # per-match rows + node_data
+    "players",        # player table
+    "analysis"        # graph-level density and clustering
+]
+
+# A stage is a regression when it is slower by more than this fraction...
+REGRESSION_THRESHOLD = 0.10
+# ...and by more than this many seconds (very short stages are mostly noise)
+REGRESSION_MIN_SECONDS = 0.01
+
+# Reported but never flagged (timed once, outside the pipeline)
+UNCOMPARED_STAGES = ["generate"]
+
+
+class StageTimer:
+    # Time (best of the repeats) or peak traced memory (max of the repeats) of every stage
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.stages = {}
+
+    def run(self, stage, function, *args, **kwargs):
+        if self.trace_memory:
+            tracemalloc.start()
+
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            seconds = time.perf_counter() - start
+
+            if self.trace_memory:
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                self.stages[stage] = max(self.stages.get(stage, 0), peak)
+            else:
+                self.record(stage, seconds)
+
+    def record(self, stage, seconds):
+        # Time of a stage measured by the stage itself (no memory of its own in a traced run)
+        if not self.trace_memory:
+            self.stages[stage] = min(self.stages.get(stage, seconds), seconds)
+
+
+def run_pipeline(timer, competition):
+    # One pass over every stage on the synthetic competition of the current directory
+    from analysis_graph_level import graphs_metrics
+    from data_paths import events_path, matches_path
+    from database import GraphStatisticWriter
+    from event_cache import build_event_cache
+    from graph_store import GraphStore
+    from match_to_graphStats import graph_fingerprint
+    from metrics import METRIC_NAMES, compute_metrics
+    from player_table_loader import load_player_table
+    from season import season_jobs
+
+    with open(matches_path(competition), "r", encoding="utf-8") as f:
+        matches = json.load(f)
+    graph_keys = [(match_id, team_id) for match_id, team_ids in season_jobs(matches) for team_id in team_ids]
+
+    timer.run("parse", build_event_cache, events_path(competition))
+    graph_store = timer.run("graph_store", GraphStore.from_json, events_path(competition))
+    networks = timer.run("graph_build", graph_store.networks, graph_keys)
+    values, metric_seconds = timer.run("metrics", compute_metrics, networks)
+    for name, seconds in metric_seconds.items():
+        timer.record(name.removesuffix("_seconds"), seconds)
+
+    def write_graphs():
+        database_path = f"Databases/Data_{competition}.db"
+        if os.path.exists(database_path):
+            os.remove(database_path)
+
+        with GraphStatisticWriter(f"sqlite:///{database_path}") as writer:
+            for i, ((match_id, team_id), network) in enumerate(zip(graph_keys, networks)):
+                scores = zip(*(values[name][i].tolist() for name in METRIC_NAMES))
+                rows = [(player_id, *player_scores) for player_id, player_scores in zip(network.nodes(), scores)]
+                writer.add_match(match_id, team_id, rows, graph_fingerprint(graph_store, match_id, team_id))
+
+    timer.run("db_write", write_graphs)
+    timer.run("players", load_player_table, competition)
+    timer.run("analysis", graphs_metrics, networks)
+
+    return {
+        "matches": len(matches),
+        "graphs": len(networks),
+        "passes": int(sum(network.weights.sum() for network in networks))
+    }
+
+
+def quiet(function, *args, **kwargs):
+    # Run function with the progress prints of the stages discarded
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    try:
+        return function(*args, **kwargs)
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+
+def benchmark_scale(n_matches, repeat=3, seed=0, events_per_match=None, trace_memory=True, keep=False):
+    # Generate a synthetic competition of n_matches matches, time the pipeline `repeat` times
+    # and trace its memory in one more run
+    from synthetic_data import EVENTS_PER_MATCH, generate_competition
+
+    timer = StageTimer()
+    memory = StageTimer(trace_memory=True)
+    root = tempfile.mkdtemp(prefix=f"benchmark_{n_matches}_")
+    cwd = os.getcwd()
+
+    try:
+        os.chdir(root)
+        os.makedirs("Databases", exist_ok=True)
+
+        n_events = timer.run(
+            "generate", generate_competition, BENCHMARK_COMPETITION, n_matches,
+            seed=seed, events_per_match=events_per_match or EVENTS_PER_MATCH
+        )
+
+        for _ in range(repeat):
+            sizes = quiet(run_pipeline, timer, BENCHMARK_COMPETITION)
+        if trace_memory:
+            quiet(run_pipeline, memory, BENCHMARK_COMPETITION)
+
+    finally:
+        os.chdir(cwd)
+        if keep:
+            print(f"  kept {root}")
+        else:
+            shutil.rmtree(root, ignore_errors=True)
+
+    sizes["events"] = n_events
+    stages = {
+        stage: {"seconds": round(seconds, 6), "peak_bytes": memory.stages.get(stage)}
+        for stage, seconds in timer.stages.items()
+    }
+
+    return {"sizes": sizes, "stages": stages}
+
+
+def run_benchmark(scales=BENCHMARK_MATCHES, repeat=3, seed=0, events_per_match=None, trace_memory=True, keep=False):
+    results = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "repeat": repeat,
+        "seed": seed,
+        "trace_memory": trace_memory,
+        "scales": {}
+    }
+
+    for n_matches in scales:
+        print(f"Benchmarking {n_matches} matches...")
+        scale = benchmark_scale(n_matches, repeat, seed, events_per_match, trace_memory, keep)
+        results["scales"][str(n_matches)] = scale
+        print_scale(n_matches, scale)
+
+    return results
+
+
+def format_bytes(n_bytes):
+    return "-" if n_bytes is None else f"{n_bytes / 2**20:.1f} MB"
+
+
+def print_scale(n_matches, scale):
+    sizes = scale["sizes"]
+    print(f"  {sizes['matches']} matches, {sizes['events']} events, {sizes['graphs']} graphs, {sizes['passes']} passes")
+    print(f"  {'stage':<14}{'seconds':>10}{'peak memory':>14}")
+
+    for stage, record in scale["stages"].items():
+        print(f"  {stage:<14}{record['seconds']:>10.3f}{format_bytes(record['peak_bytes']):>14}")
+
+
+def compare_results(baseline, current, threshold=REGRESSION_THRESHOLD, min_seconds=REGRESSION_MIN_SECONDS):
+    # (scale, stage, metric, baseline value, current value, ratio, regression) for every stage
+    # present in both results
+    rows = []
+
+    for scale, current_scale in current["scales"].items():
+        baseline_scale = baseline["scales"].get(scale)
+        if baseline_scale is None:
+            continue
+
+        for stage, record in current_scale["stages"].items():
+            baseline_record = baseline_scale["stages"].get(stage)
+            if baseline_record is None or stage in UNCOMPARED_STAGES:
+                continue
+
+            old, new = baseline_record["seconds"], record["seconds"]
+            ratio = new / old if old > 0 else float("inf")
+            rows.append((scale, stage, "seconds", old, new, ratio, ratio > 1 + threshold and new - old > min_seconds))
+
+            old, new = baseline_record.get("peak_bytes"), record.get("peak_bytes")
+            if old and new:
+                ratio = new / old
+                rows.append((scale, stage, "peak_bytes", old, new, ratio, ratio > 1 + threshold))
+
+    return rows
+
+
+def print_comparison(rows):
+    print(f"{'matches':>8}  {'stage':<14}{'metric':<12}{'baseline':>14}{'current':>14}{'ratio':>8}")
+
+    for scale, stage, metric, old, new, ratio, regression in rows:
+        if metric == "seconds":
+            old, new = f"{old:.3f}s", f"{new:.3f}s"
+        else:
+            old, new = format_bytes(old), format_bytes(new)
+
+        flag = "  REGRESSION" if regression else ""
+        print(f"{scale:>8}  {stage:<14}{metric:<12}{old:>14}{new:>14}{ratio:>8.2f}{flag}")
+
+
+def load_results(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_results(results, path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages on synthetic competitions.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="run the benchmark and save the results")
+    run.add_argument("--matches", type=int, nargs="+", default=BENCHMARK_MATCHES, help="competition sizes (matches)")
+    run.add_argument("--repeat", type=int, default=3, help="timed runs per size, the best time is kept")
+    run.add_argument("--seed", type=int, default=0)
+    run.add_argument("--events-per-match", type=int, default=None)
+    run.add_argument("--no-memory", action="store_true", help="skip the memory traced run")
+    run.add_argument("--keep", action="store_true", help="keep the generated directories")
+    run.add_argument("--output", default=BENCHMARK_OUTPUT_PATH)
+    run.add_argument("--baseline", default=None, help="results to compare with after the run")
+    run.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+
+    compare = commands.add_parser("compare", help="compare two results files")
+    compare.add_argument("baseline")
+    compare.add_argument("current")
+    compare.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        results = run_benchmark(
+            args.matches, repeat=args.repeat, seed=args.seed, events_per_match=args.events_per_match,
+            trace_memory=not args.no_memory, keep=args.keep
+        )
+        save_results(results, args.output)
+        print(f"Results written to {args.output}")
+
+        if args.baseline is None:
+            return 0
+        baseline, current = load_results(args.baseline), results
+    else:
+        baseline, current = load_results(args.baseline), load_results(args.current)
+
+    rows = compare_results(baseline, current, threshold=args.threshold)
+    print_comparison(rows)
+
+    regressions = [row for row in rows if row[-1]]
+    print(f"\n{len(regressions)} regression(s) above {args.threshold:.0%}")
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
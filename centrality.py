@@ -0,0 +1,308 @@
+import warnings
+import numpy as np
+import scipy as sp
+import networkx as nx
+
+from pass_network import as_pass_network
+
+
+# Graphs scored together by batched_betweenness, bounds the (graphs, n, n, n) temporaries
+BETWEENNESS_BATCH_SIZE = 128
+
+
+def stack_graphs(graphs):
+    # Block-diagonal sparse adjacency of many graphs (PassNetwork or networkx).
+    # Returns the csr matrix, the node list of every graph and the block id of every row
+    networks = [as_pass_network(G) for G in graphs]
+    nodelists = [network.nodes() for network in networks]
+    sizes = np.array([len(network) for network in networks], dtype=np.int64)
+    offsets = np.r_[0, np.cumsum(sizes)]
+    n_nodes = int(offsets[-1])
+
+    rows, cols, data = [np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype=np.int64)], [np.zeros(0)]
+    for network, offset in zip(networks, offsets):
+        r, c = np.nonzero(network.weights)
+        rows.append(r + offset)
+        cols.append(c + offset)
+        data.append(network.weights[r, c].astype(float))
+
+    A = sp.sparse.csr_array(
+        (np.concatenate(data), (np.concatenate(rows), np.concatenate(cols))),
+        shape=(n_nodes, n_nodes)
+    )
+    blocks = np.repeat(np.arange(len(graphs)), sizes)
+
+    return A, nodelists, blocks
+
+
+def stack_transition(graphs):
+    # Row normalized block-diagonal transition matrix of the non empty graphs of a batch.
+    # Returns (P, is_dangling, blocks, sizes, nodelists, batch): batch holds the positions
+    # of the non empty graphs in graphs, blocks the block of every row
+    batch = [i for i, G in enumerate(graphs) if len(G) > 0]
+    if not batch:
+        return None, None, None, None, [], batch
+
+    A, nodelists, blocks = stack_graphs([graphs[i] for i in batch])
+    sizes = np.bincount(blocks, minlength=len(batch))
+
+    S = A.sum(axis=1)
+    S[S != 0] = 1.0 / S[S != 0]
+    Q = sp.sparse.dia_array((S.T, 0), shape=A.shape).tocsr()
+
+    return Q @ A, S == 0, blocks, sizes, nodelists, batch
+
+
+def pagerank_vectors(graphs, transition, alpha=0.85, max_iter=100, tol=1.0e-6, nstart=None):
+    # PageRank of every graph as an array in node order (empty for empty graphs),
+    # from the stack_transition of the graphs
+    P, is_dangling, blocks, sizes, nodelists, batch = transition
+    vectors = [np.zeros(0) for _ in graphs]
+
+    # empty graphs have no PageRank
+    if not batch:
+        return vectors
+
+    n_blocks = len(batch)
+
+    # uniform personalization and dangling weights inside every block
+    p = 1.0 / sizes[blocks]
+
+    if nstart is None:
+        x = p.copy()
+    else:
+        x = np.concatenate([
+            np.full(len(nodelist), 1.0 / len(nodelist)) if nstart[i] is None else np.asarray(nstart[i], dtype=float)
+            for i, nodelist in zip(batch, nodelists)
+        ])
+        x /= np.bincount(blocks, weights=x, minlength=n_blocks)[blocks]
+
+    active = np.ones(n_blocks, dtype=bool)
+
+    # power iteration: make up to max_iter iterations
+    for _ in range(max_iter):
+        dangling_sum = np.bincount(blocks, weights=np.where(is_dangling, x, 0.0), minlength=n_blocks)
+        x_next = alpha * (x @ P + dangling_sum[blocks] * p) + (1 - alpha) * p
+
+        # check convergence per block, l1 norm
+        err = np.bincount(blocks, weights=np.absolute(x_next - x), minlength=n_blocks)
+
+        # converged blocks keep the value of the iteration they converged at
+        x = np.where(active[blocks], x_next, x)
+        active &= ~(err < sizes * tol)
+
+        if not active.any():
+            break
+    else:
+        raise nx.PowerIterationFailedConvergence(max_iter)
+
+    offsets = np.r_[0, np.cumsum(sizes)]
+    for k, i in enumerate(batch):
+        vectors[i] = x[offsets[k]:offsets[k + 1]]
+
+    return vectors
+
+
+def batched_pagerank(graphs, alpha=0.85, max_iter=100, tol=1.0e-6, nstart=None):
+    # Weighted PageRank of many graphs at once, same result as nx.pagerank on each graph.
+    # All the graphs are stacked in one block-diagonal transition matrix and iterated together
+    # with vectorized power iteration; every block stops updating as soon as it converges
+    # (l1 error < len(block) * tol, like networkx), dangling nodes jump uniformly inside their block.
+    # nstart: optional list with the starting vector of every graph (None for the uniform start)
+    transition = stack_transition(graphs)
+    vectors = pagerank_vectors(graphs, transition, alpha, max_iter, tol, nstart)
+
+    results = [{} for _ in graphs]
+    for i, nodelist in zip(transition[5], transition[4]):
+        results[i] = dict(zip(nodelist, map(float, vectors[i])))
+
+    return results
+
+
+def stack_adjacency(graphs):
+    # Dense weighted adjacency of many graphs (PassNetwork or networkx) in one (graphs, n, n) array,
+    # padded with zeros up to the largest graph. Returns the array and the node lists
+    networks = [as_pass_network(G) for G in graphs]
+    n = max((len(network) for network in networks), default=0)
+    W = np.zeros((len(networks), n, n))
+
+    for b, network in enumerate(networks):
+        size = len(network)
+        W[b, :size, :size] = network.weights
+
+    return W, [network.nodes() for network in networks]
+
+
+def shortest_path_lengths(W, inverse_weights=False):
+    # All-pairs shortest path lengths of a stack of weighted adjacency matrices.
+    # D[b, s, t]: length of the shortest s->t path in graph b (inf if unreachable).
+    # Edge lengths are the weights (as networkx does with weight="weight") or 1 / weights.
+    # Returns D and the edge lengths (inf where there is no edge)
+    n_graphs, n, _ = W.shape
+    has_edge = W > 0
+    # self loops never lie on a shortest path
+    has_edge &= ~np.eye(n, dtype=bool)
+
+    length = np.where(has_edge, 1.0 / np.where(has_edge, W, 1.0) if inverse_weights else W, np.inf)
+
+    # Floyd-Warshall, vectorized over the graphs and the (s, t) pairs
+    D = length.copy()
+    D[:, np.arange(n), np.arange(n)] = 0.0
+    for k in range(n):
+        np.minimum(D, D[:, :, k, None] + D[:, None, k, :], out=D)
+
+    return D, length
+
+
+def shortest_path_counts(D, length):
+    # sigma[b, s, t]: number of shortest s->t paths, from the shortest_path_lengths of the stack
+    n = D.shape[1]
+    has_edge = np.isfinite(length)
+
+    # v is a predecessor of t on the shortest s->t paths if D[s, v] + length(v, t) == D[s, t]
+    # (exact for integer pass counts, a relative tolerance covers the inverse weights)
+    target = D[:, :, None, :]
+    through = D[:, :, :, None] + length[:, None, :, :]
+    predecessor = has_edge[:, None, :, :] & np.isfinite(target) & np.isclose(through, target, rtol=1e-12, atol=0.0)
+    predecessor = predecessor.astype(float)
+
+    # count the paths visiting the targets by increasing distance from each source:
+    # the predecessors of a node are always closer, so their counts are already final
+    sigma = np.zeros_like(D)
+    sigma[:, np.arange(n), np.arange(n)] = 1.0
+    order = np.argsort(D, axis=2, kind="stable")
+
+    for k in range(1, n):
+        t = order[:, :, k]
+        # predecessor[b, s, :, t[b, s]]
+        predecessor_t = np.take_along_axis(predecessor, t[:, :, None, None], axis=3)[:, :, :, 0]
+        counts = (sigma * predecessor_t).sum(axis=2)
+        np.put_along_axis(sigma, t[:, :, None], counts[:, :, None], axis=2)
+
+    return sigma
+
+
+def batched_shortest_paths(W, inverse_weights=False):
+    # All-pairs shortest path lengths D and path counts sigma of a stack of weighted adjacency matrices
+    D, length = shortest_path_lengths(W, inverse_weights=inverse_weights)
+    return D, shortest_path_counts(D, length)
+
+
+def betweenness_from_paths(D, sigma, sizes):
+    # Normalized betweenness of every node of the stack from its shortest paths:
+    #     betweenness(v) = sum over s != v != t of sigma(s, v) * sigma(v, t) / sigma(s, t)
+    #                      when D(s, v) + D(v, t) == D(s, t)
+    # rescaled like networkx: 1 / ((n - 1)(n - 2)) for directed graphs of n > 2 nodes
+    n = D.shape[1]
+
+    finite = np.isfinite(D)
+    on_path = (
+        finite[:, :, :, None] & finite[:, None, :, :] & finite[:, :, None, :] &
+        np.isclose(D[:, :, :, None] + D[:, None, :, :], D[:, :, None, :], rtol=1e-12, atol=0.0)
+    )
+    # endpoints are not counted
+    distinct = ~np.eye(n, dtype=bool)
+    on_path &= distinct[None, :, :, None] & distinct[None, None, :, :] & distinct[None, :, None, :]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        dependency = sigma[:, :, :, None] * sigma[:, None, :, :] / sigma[:, :, None, :]
+    betweenness = np.where(on_path, dependency, 0.0).sum(axis=(1, 3))
+
+    sizes = np.asarray(sizes)
+    scale = np.where(sizes > 2, (sizes - 1) * (sizes - 2), 1)
+    return betweenness / scale[:, None]
+
+
+def closeness_from_distances(D, sizes):
+    # Closeness of every node of the stack, same as nx.closeness_centrality(G, distance="weight"):
+    # incoming distances, scaled by the fraction of the graph reaching the node (wf_improved)
+    sizes = np.asarray(sizes)[:, None]
+    finite = np.isfinite(D)
+
+    # sources reaching every target (itself included) and their total distance
+    reach = finite.sum(axis=1)
+    total = np.where(finite, D, 0.0).sum(axis=1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        closeness = (reach - 1) / total * (reach - 1) / (sizes - 1)
+    return np.where((total > 0) & (sizes > 1), closeness, 0.0)
+
+
+def harmonic_from_distances(D):
+    # Harmonic centrality of every node of the stack, same as nx.harmonic_centrality(G, distance="weight"):
+    # sum of 1 / d(s, v) over the sources s reaching v
+    reachable = np.isfinite(D) & (D > 0)
+    with np.errstate(divide="ignore"):
+        return np.where(reachable, 1.0 / D, 0.0).sum(axis=1)
+
+
+def eigenvector_from_adjacency(W, sizes, max_iter=100, tol=1.0e-6):
+    # Eigenvector centrality of every graph of a (graphs, n, n) stack, same iteration as
+    # nx.eigenvector_centrality(G, weight="weight"): power iteration on (A + I)^T from the
+    # uniform vector, L2 normalized, l1 convergence per graph (error < n * tol).
+    # A graph not converged after max_iter keeps its last iterate with a RuntimeWarning
+    # (networkx raises instead)
+    sizes = np.asarray(sizes)
+    n = W.shape[1]
+    is_node = np.arange(n)[None, :] < sizes[:, None]
+
+    x = np.where(is_node, 1.0 / np.maximum(sizes, 1)[:, None], 0.0)
+    active = sizes > 0
+
+    for _ in range(max_iter):
+        if not active.any():
+            break
+
+        x_next = x + np.einsum("bi,bij->bj", x, W)
+        norm = np.sqrt((x_next ** 2).sum(axis=1))
+        x_next /= np.where(norm > 0, norm, 1.0)[:, None]
+
+        err = np.absolute(x_next - x).sum(axis=1)
+
+        # converged graphs keep the value of the iteration they converged at
+        x = np.where(active[:, None], x_next, x)
+        active &= ~(err < sizes * tol)
+
+    if active.any():
+        warnings.warn(
+            f"eigenvector centrality not converged in {max_iter} iterations for {int(active.sum())} "
+            f"of {len(sizes)} graphs (graphs {np.flatnonzero(active).tolist()} of the stack), last iterate kept",
+            RuntimeWarning
+        )
+
+    return x
+
+
+def batched_betweenness(graphs, inverse_weights=False):
+    # Normalized betweenness centrality of many small graphs at once,
+    # same values as nx.betweenness_centrality(G, weight="weight") on each graph.
+    # The graphs are stacked in a (graphs, n, n) array; shortest paths and path counts
+    # are computed for all of them together and every (s, v, t) triple is scored in one pass:
+    #     betweenness(v) = sum over s != v != t of sigma(s, v) * sigma(v, t) / sigma(s, t)
+    #                      when D(s, v) + D(v, t) == D(s, t)
+    # inverse_weights=True uses 1 / pass count as edge length, so that frequent passing
+    # combinations are "short" (networkx and the default treat the pass count itself as length).
+    # With inverse weights equal-length paths are matched with a relative tolerance, while networkx
+    # given the same 1 / weight lengths compares float sums exactly and can miss some ties
+    if len(graphs) > BETWEENNESS_BATCH_SIZE:
+        return [
+            result
+            for start in range(0, len(graphs), BETWEENNESS_BATCH_SIZE)
+            for result in batched_betweenness(
+                graphs[start:start + BETWEENNESS_BATCH_SIZE],
+                inverse_weights=inverse_weights
+            )
+        ]
+
+    W, nodelists = stack_adjacency(graphs)
+
+    if W.shape[1] == 0:
+        return [{} for _ in graphs]
+
+    D, sigma = batched_shortest_paths(W, inverse_weights=inverse_weights)
+    betweenness = betweenness_from_paths(D, sigma, [len(nodelist) for nodelist in nodelists])
+
+    return [
+        dict(zip(nodelist, map(float, betweenness[b, :len(nodelist)])))
+        for b, nodelist in enumerate(nodelists)
+    ]
@@ -0,0 +1,96 @@
+import numpy as np
+
+from centrality import stack_adjacency
+
+
+# Graphs scored together by batched_clustering, bounds the (graphs, n, n) temporaries
+CLUSTERING_BATCH_SIZE = 1024
+
+
+def symmetrize_stack(W):
+    # Undirected weights of a (graphs, n, n) stack with the semantics of nx DiGraph.to_undirected():
+    # when both i->j and j->i exist the edge of the later node in the node order wins
+    lower = np.tril(W, -1)
+    upper = np.swapaxes(np.triu(W, 1), 1, 2)
+    merged = np.where(lower > 0, lower, upper)
+
+    diagonal = np.zeros_like(W)
+    n = W.shape[1]
+    diagonal[:, np.arange(n), np.arange(n)] = W[:, np.arange(n), np.arange(n)]
+
+    return merged + np.swapaxes(merged, 1, 2) + diagonal
+
+
+def normalized_weights(W):
+    # Geometric-mean clustering weights: cube root of every weight divided by the largest weight
+    # of its graph (self loops included, like networkx), self loops then removed
+    max_weight = W.max(axis=(1, 2), keepdims=True)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        C = np.cbrt(np.where(max_weight > 0, W / max_weight, 0.0))
+
+    n = W.shape[1]
+    C[:, np.arange(n), np.arange(n)] = 0.0
+    return C
+
+
+def clustering_stack(W, directed=False):
+    # Weighted clustering of every node of a (graphs, n, n) adjacency stack (zero padded).
+    # Undirected: nx.clustering(G.to_undirected(), weight="weight")
+    #     c(i) = [C^3]_ii / (deg(i) (deg(i) - 1)) on the symmetrized weights
+    # Directed: nx.clustering(G, weight="weight") on the DiGraph (Fagiolo), no lossy conversion
+    #     c(i) = [(C + C^T)^3]_ii / (2 (dt(i) (dt(i) - 1) - 2 db(i)))
+    #     dt = in + out degree, db = reciprocal edges
+    if W.shape[1] == 0:
+        return np.zeros(W.shape[:2])
+
+    if directed:
+        C = normalized_weights(W)
+        S = C + np.swapaxes(C, 1, 2)
+        triangles = ((S @ S) * S).sum(axis=2)
+
+        linked = C > 0
+        total_degree = linked.sum(axis=1) + linked.sum(axis=2)
+        reciprocal_degree = (linked & np.swapaxes(linked, 1, 2)).sum(axis=2)
+        possible = 2 * (total_degree * (total_degree - 1) - 2 * reciprocal_degree)
+    else:
+        C = normalized_weights(symmetrize_stack(W))
+        triangles = ((C @ C) * C).sum(axis=2)
+
+        degree = (C > 0).sum(axis=2)
+        possible = degree * (degree - 1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(triangles > 0, triangles / possible, 0.0)
+
+
+def batched_clustering(graphs, directed=False):
+    # Weighted clustering of the nodes of many small graphs (PassNetwork or networkx) at once,
+    # same values as nx.clustering(G.to_undirected(), weight="weight") on each graph
+    # (directed=True: nx.clustering(G, weight="weight") on the directed graph).
+    # Returns one {player_id: clustering} per graph
+    results = []
+
+    for start in range(0, len(graphs), CLUSTERING_BATCH_SIZE):
+        W, nodelists = stack_adjacency(graphs[start:start + CLUSTERING_BATCH_SIZE])
+        values = clustering_stack(W, directed=directed)
+
+        for b, nodelist in enumerate(nodelists):
+            results.append(dict(zip(nodelist, map(float, values[b, :len(nodelist)]))))
+
+    return results
+
+
+def batched_average_clustering(graphs, directed=False):
+    # Average clustering of every graph (nx.average_clustering, zeros included), 0.0 for empty graphs
+    averages = []
+
+    for start in range(0, len(graphs), CLUSTERING_BATCH_SIZE):
+        W, nodelists = stack_adjacency(graphs[start:start + CLUSTERING_BATCH_SIZE])
+        values = clustering_stack(W, directed=directed)
+
+        sizes = np.array([len(nodelist) for nodelist in nodelists])
+        totals = values.sum(axis=1) if len(nodelists) else np.zeros(0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            averages.extend(np.where(sizes > 0, totals / np.maximum(sizes, 1), 0.0).tolist())
+
+    return averages
@@ -0,0 +1,20 @@
+import os
+
+
+# Layout of the extracted Wyscout data (see extractRawData.cmd), relative to the project root.
+# Every script and stage reads the events, matches, players and teams from these paths,
+# so they all share one event cache per competition
+
+DATA_PATH = "Data"
+EVENTS_DIRECTORY_PATH = os.path.join(DATA_PATH, "Events")
+MATCHES_DIRECTORY_PATH = os.path.join(DATA_PATH, "matches")
+PLAYERS_PATH = os.path.join(DATA_PATH, "Players", "players.json")
+TEAMS_PATH = os.path.join(DATA_PATH, "Teams", "teams.json")
+
+
+def events_path(competition):
+    return os.path.join(EVENTS_DIRECTORY_PATH, f"events_{competition}.json")
+
+
+def matches_path(competition):
+    return os.path.join(MATCHES_DIRECTORY_PATH, f"matches_{competition}.json")
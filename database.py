@@ -1,62 +1,277 @@
-from sqlalchemy import create_engine, exists
+import math
+import time
+from sqlalchemy import bindparam, create_engine, event, inspect, select, text
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.orm import declarative_base
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from Models.NodeData import NodeData
+from Models.MatchNodeData import MatchNodeData
+from Models.MatchGraph import MatchGraph
 from Models.Player import Player
+from Models.RunState import RunState
 from Models.Base import Base
+from event_statistics import EVENT_STATISTICS
+from metrics import SCORE_COLUMNS
+import instrumentation
+
+
+# Number of player rows collected before the writer flushes a batch
+GRAPH_STATISTIC_BATCH_SIZE = 5000
+
+# run_state flag: graphs were committed after node_data was last derived
+NODE_DATA_STALE = "node_data_stale"
+
+# Milliseconds a sqlite connection waits for a lock held by another process before failing
+SQLITE_BUSY_TIMEOUT_MS = 60000
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL: readers never block the writer (and the other way round), commits are cheaper.
+    # busy_timeout: wait for the lock of another writer instead of "database is locked"
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.close()
 
 
 def init_db(database_url):
     engine = create_engine(database_url, echo=False)
-    Base.metadata.create_all(engine)
+    if engine.dialect.name == "sqlite":
+        event.listen(engine, "connect", set_sqlite_pragmas)
 
+    try:
+        Base.metadata.create_all(engine)
+    except OperationalError:
+        # another process created the tables between the check and the create
+        Base.metadata.create_all(engine)
 
-def add_graph_statistic(
-    database_url,
-    player_id,
-    score_betweenness,
-    score_pagerank,
-    score_degree
-):
-    init_db(database_url=database_url)
+    add_missing_columns(engine)
+    return engine
 
-    engine = create_engine(database_url, echo=False)
-    SessionLocal = sessionmaker(bind=engine)
-    session = SessionLocal()
 
+def add_missing_columns(engine):
+    # Databases created before a metric was registered get its (empty) score columns.
+    # The graphs stored without it have an older metric set in their fingerprint and are
+    # computed again by the next season run. Same for the event statistics of the players table,
+    # filled by the next player table load
+    tables = [
+        (MatchNodeData.__table__, SCORE_COLUMNS, "FLOAT"),
+        (NodeData.__table__, SCORE_COLUMNS, "FLOAT"),
+        (Player.__table__, list(EVENT_STATISTICS), "INTEGER")
+    ]
+
+    for table, columns, column_type in tables:
+        existing = {column["name"] for column in inspect(engine).get_columns(table.name)}
+        missing = [column for column in columns if column not in existing]
+
+        for column in missing:
+            try:
+                with engine.begin() as connection:
+                    connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column} {column_type}"))
+            except OperationalError:
+                # added by another process in the meantime
+                pass
+
+
+def stored_fingerprints(database_url):
+    # (match_id, team_id) -> fingerprint of every graph stored in a database. A plain read:
+    # no table is created or altered, in WAL mode it does not wait for (nor block) a writer
+    engine = create_engine(database_url, echo=False)
     try:
-        player_already_present = session.query(
-            exists().where(NodeData.player_id == int(player_id))
-        ).scalar()
-
-        if player_already_present:
-            existing_node = (
-                session.query(NodeData)
-                .filter_by(player_id=int(player_id))
-                .first()
+        if not inspect(engine).has_table(MatchGraph.__tablename__):
+            return {}
+
+        with engine.connect() as connection:
+            return {
+                (match_id, team_id): fingerprint
+                for match_id, team_id, fingerprint in connection.execute(
+                    select(MatchGraph.match_id, MatchGraph.team_id, MatchGraph.fingerprint)
+                )
+            }
+    finally:
+        engine.dispose()
+
+
+class GraphStatisticWriter:
+    # Batched writer for the graph statistics: reuses one engine and one session for a whole run.
+    # Every (match, team) graph is stored as per-player rows in match_node_data keyed by match id,
+    # so writing a match again replaces it instead of counting it twice.
+    # node_data (games and score sums per player) is derived from those rows when the writer closes.
+    # Whether node_data is behind the graphs is stored with them (run_state), so a run that crashed
+    # before closing is completed by the next one, even if it has no graph left to compute.
+    # Only the graph writers (season and match runs) derive node_data: a writer opened with
+    # derive_node_data=False (e.g. a players table load running next to a season) never touches it.
+    # A failed write is rolled back and its exception raised to the caller, nothing is dropped silently
+
+    def __init__(self, database_url, batch_size=GRAPH_STATISTIC_BATCH_SIZE, derive_node_data=True):
+        self.engine = init_db(database_url=database_url)
+        SessionLocal = sessionmaker(bind=self.engine)
+        self.session = SessionLocal()
+
+        self.batch_size = batch_size
+        self.derive_node_data = derive_node_data
+        self.pending_count = 0
+        # (match_id, team_id) -> (fingerprint, rows)
+        self.pending = {}
+        # node_data has to be derived again from match_node_data (also after an interrupted run)
+        self.node_data_stale = bool(self.session.scalar(
+            select(RunState.value).where(RunState.name == NODE_DATA_STALE)
+        ))
+
+    def stored_fingerprints(self):
+        # (match_id, team_id) -> fingerprint of every graph already stored
+        return {
+            (match_id, team_id): fingerprint
+            for match_id, team_id, fingerprint in self.session.execute(
+                select(MatchGraph.match_id, MatchGraph.team_id, MatchGraph.fingerprint)
+            )
+        }
+
+    def add_match(self, match_id, team_id, rows, fingerprint=None):
+        # rows: (player_id, score of every metric in SCORE_COLUMNS order) of one team in one match
+        self.pending[(int(match_id), int(team_id))] = (fingerprint, rows)
+
+        self.pending_count += len(rows) + 1
+        if self.pending_count >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+
+        graphs = [
+            {"match_id": match_id, "team_id": team_id, "fingerprint": fingerprint}
+            for (match_id, team_id), (fingerprint, rows) in self.pending.items()
+        ]
+        player_rows = [
+            {
+                "match_id": match_id,
+                "team_id": team_id,
+                "player_id": int(player_id),
+                **dict(zip(SCORE_COLUMNS, map(float, scores)))
+            }
+            for (match_id, team_id), (fingerprint, rows) in self.pending.items()
+            for player_id, *scores in rows
+        ]
+
+        # drop the previous rows of the graphs written again
+        delete_graph_rows = MatchNodeData.__table__.delete().where(
+            (MatchNodeData.match_id == bindparam("graph_match_id")) &
+            (MatchNodeData.team_id == bindparam("graph_team_id"))
+        )
+
+        upsert_graphs = sqlite_insert(MatchGraph)
+        upsert_graphs = upsert_graphs.on_conflict_do_update(
+            index_elements=[MatchGraph.match_id, MatchGraph.team_id],
+            set_={"fingerprint": upsert_graphs.excluded.fingerprint}
+        )
+
+        # the whole batch is one transaction: a graph is marked as stored (match_graphs)
+        # only together with its rows, an interrupted run resumes from the graphs not marked
+        start = time.perf_counter()
+        try:
+            self.session.execute(
+                delete_graph_rows,
+                [{"graph_match_id": graph["match_id"], "graph_team_id": graph["team_id"]} for graph in graphs]
             )
+            if player_rows:
+                self.session.execute(sqlite_insert(MatchNodeData), player_rows)
+            self.session.execute(upsert_graphs, graphs)
+            self.set_state(NODE_DATA_STALE, 1)
+            self.session.commit()
+            self.node_data_stale = True
 
-            existing_node.games += 1
-            existing_node.score_betweenness += score_betweenness
-            existing_node.score_pagerank += score_pagerank
-            existing_node.score_degree += score_degree
-
-        else:
-            new_node = NodeData(
-                player_id=int(player_id),
-                games=1,
-                score_betweenness=score_betweenness,
-                score_pagerank=score_pagerank,
-                score_degree=score_degree
+            instrumentation.record(
+                "flush",
+                graphs=len(graphs),
+                rows=len(player_rows),
+                db_write_seconds=time.perf_counter() - start
             )
-            session.add(new_node)
 
-        session.commit()
-        
-    except Exception as e:
-        # Catch any  unexpected error
-        print(f"Unexpected error: {e}")
-        session.rollback()
+        except Exception:
+            # the batch is not written: undo it and report the failure
+            self.session.rollback()
+            raise
 
-    finally:
-        session.close()
\ No newline at end of file
+        finally:
+            self.pending = {}
+            self.pending_count = 0
+
+    def set_state(self, name, value):
+        # run_state flag, written in the current transaction
+        upsert_state = sqlite_insert(RunState).values(name=name, value=value)
+        self.session.execute(upsert_state.on_conflict_do_update(
+            index_elements=[RunState.name],
+            set_={"value": upsert_state.excluded.value}
+        ))
+
+    def refresh_node_data(self):
+        # Derive node_data from the per-match rows: games played and exact (fsum) score sums.
+        # Sums do not depend on the order the matches were written in
+        start = time.perf_counter()
+        scores = {}
+        score_columns = [MatchNodeData.__table__.c[column] for column in SCORE_COLUMNS]
+        for player_id, *row_scores in self.session.execute(select(MatchNodeData.player_id, *score_columns)):
+            player_scores = scores.setdefault(player_id, [[] for _ in SCORE_COLUMNS])
+            for values, score in zip(player_scores, row_scores):
+                values.append(score)
+
+        rows = [
+            {
+                "player_id": player_id,
+                "games": len(player_scores[0]),
+                **{column: math.fsum(values) for column, values in zip(SCORE_COLUMNS, player_scores)}
+            }
+            for player_id, player_scores in sorted(scores.items())
+        ]
+
+        try:
+            self.session.execute(NodeData.__table__.delete())
+            if rows:
+                self.session.execute(sqlite_insert(NodeData), rows)
+            self.set_state(NODE_DATA_STALE, 0)
+            self.session.commit()
+            self.node_data_stale = False
+
+            instrumentation.record("node_data", players=len(rows), node_data_seconds=time.perf_counter() - start)
+
+        except Exception:
+            self.session.rollback()
+            raise
+
+    def save_players(self, rows):
+        # Players table rows (dicts with every Player column) as one bulk upsert in one transaction:
+        # existing players are replaced, the others kept
+        if not rows:
+            return
+
+        columns = [column.name for column in Player.__table__.columns]
+
+        upsert_players = sqlite_insert(Player)
+        upsert_players = upsert_players.on_conflict_do_update(
+            index_elements=[Player.playerId],
+            set_={column: upsert_players.excluded[column] for column in columns if column != "playerId"}
+        )
+
+        try:
+            self.session.execute(upsert_players, rows)
+            self.session.commit()
+        except Exception:
+            self.session.rollback()
+            raise
+
+    def close(self):
+        try:
+            self.flush()
+            if self.derive_node_data and self.node_data_stale:
+                self.refresh_node_data()
+        finally:
+            self.session.close()
+            self.engine.dispose()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
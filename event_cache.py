@@ -0,0 +1,290 @@
+import gc
+import hashlib
+import itertools
+import json
+import os
+import shutil
+import numpy as np
+import pandas as pd
+
+from event_stream import iter_json_file
+
+
+# Bump when the layout of the cache changes, older caches are then rebuilt
+CACHE_VERSION = 3
+
+META_FILE = "meta.json"
+
+# Typed numeric columns, one .npy file each
+NUMERIC_COLUMNS = {
+    "id": np.int64,
+    "matchId": np.int32,
+    "teamId": np.int32,
+    "playerId": np.int32,
+    "eventSec": np.float64
+}
+
+# Start and end point of every event: column -> (index in the positions list, axis).
+# Wyscout positions are percentages of the pitch, -1 when the event has no such point
+POSITION_COLUMNS = {
+    "startX": (0, "x"),
+    "startY": (0, "y"),
+    "endX": (1, "x"),
+    "endY": (1, "y")
+}
+POSITION_DTYPE = np.int16
+MISSING_POSITION = -1
+
+# String columns stored as small integer codes + the list of categories in the meta file
+CATEGORICAL_COLUMNS = ["matchPeriod", "eventName", "subEventName"]
+
+# Tag ids of all the events packed in one array, event i owns tag_ids[tag_offsets[i]:tag_offsets[i + 1]]
+TAG_IDS_FILE = "tag_ids.npy"
+TAG_OFFSETS_FILE = "tag_offsets.npy"
+
+# Events converted at a time while building the cache, only one batch of event dicts is in memory
+BUILD_BATCH_SIZE = 50000
+
+# Bytes of the events json hashed at a time
+HASH_BLOCK_SIZE = 1 << 20
+
+
+def cache_directory(json_path):
+    # events_Italy.json -> events_Italy.cache/
+    return os.path.splitext(json_path)[0] + ".cache"
+
+
+def source_signature(json_path):
+    # Size and modification time of the source json, used to detect changes
+    stat = os.stat(json_path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def event_position(event, point, axis):
+    # One coordinate of the start (point 0) or end (point 1) of an event
+    positions = event.get("positions") or ()
+    return positions[point][axis] if len(positions) > point else MISSING_POSITION
+
+
+def write_event_cache(events, directory, source, source_hash=None):
+    # Convert raw Wyscout events (any iterable, e.g. a stream of the json) to the columnar layout.
+    # The events are converted in batches, so the peak memory is one batch of dicts plus
+    # the typed columns. The cache is written in a temporary directory and moved in place
+    # at the end, so a reader never sees a half written cache
+    tmp_directory = directory + ".tmp"
+    shutil.rmtree(tmp_directory, ignore_errors=True)
+    os.makedirs(tmp_directory)
+
+    columns = {column: [] for column in list(NUMERIC_COLUMNS) + list(POSITION_COLUMNS) + CATEGORICAL_COLUMNS}
+    # categorical column -> {value: code}, in order of first appearance
+    categories = {column: {} for column in CATEGORICAL_COLUMNS}
+    tag_counts = []
+    tag_ids = []
+
+    events = iter(events)
+    while True:
+        batch = list(itertools.islice(events, BUILD_BATCH_SIZE))
+        if not batch:
+            break
+
+        n_events = len(batch)
+
+        for column, dtype in NUMERIC_COLUMNS.items():
+            columns[column].append(
+                np.fromiter((event.get(column) or 0 for event in batch), dtype=dtype, count=n_events)
+            )
+
+        for column, (point, axis) in POSITION_COLUMNS.items():
+            columns[column].append(
+                np.fromiter((event_position(event, point, axis) for event in batch), dtype=POSITION_DTYPE, count=n_events)
+            )
+
+        for column in CATEGORICAL_COLUMNS:
+            codes = categories[column]
+            columns[column].append(np.fromiter(
+                (codes.setdefault(event.get(column) or "", len(codes)) for event in batch),
+                dtype=np.int16,
+                count=n_events
+            ))
+
+        counts = np.fromiter((len(event.get("tags", ())) for event in batch), dtype=np.int64, count=n_events)
+        tag_counts.append(counts)
+        tag_ids.append(np.fromiter(
+            (tag["id"] for event in batch for tag in event.get("tags", ())),
+            dtype=np.int32,
+            count=int(counts.sum())
+        ))
+
+    for column, chunks in columns.items():
+        dtype = NUMERIC_COLUMNS.get(column, POSITION_DTYPE if column in POSITION_COLUMNS else np.int16)
+        np.save(os.path.join(tmp_directory, f"{column}.npy"), np.concatenate(chunks) if chunks else np.zeros(0, dtype=dtype))
+
+    tag_counts = np.concatenate(tag_counts) if tag_counts else np.zeros(0, dtype=np.int64)
+    tag_offsets = np.zeros(len(tag_counts) + 1, dtype=np.int64)
+    np.cumsum(tag_counts, out=tag_offsets[1:])
+    np.save(os.path.join(tmp_directory, TAG_IDS_FILE), np.concatenate(tag_ids) if tag_ids else np.zeros(0, dtype=np.int32))
+    np.save(os.path.join(tmp_directory, TAG_OFFSETS_FILE), tag_offsets)
+
+    meta = {
+        "version": CACHE_VERSION,
+        "source": source,
+        "source_hash": source_hash,
+        "rows": len(tag_counts),
+        "categories": {column: list(codes) for column, codes in categories.items()}
+    }
+    with open(os.path.join(tmp_directory, META_FILE), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(tmp_directory, directory)
+
+
+def file_hash(path):
+    # sha256 of a file, read in blocks
+    digest = hashlib.sha256()
+
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+def build_event_cache(json_path):
+    # One-time conversion of events_{competition}.json to its columnar cache.
+    # The json is streamed, the list of all the event dicts is never built
+    print(f"Building columnar cache for {json_path}...")
+
+    # content hash of the source, identifies the events in the metrics cache
+    source_hash = file_hash(json_path)
+
+    # the parsed events hold no reference cycles: pausing the garbage collector avoids
+    # rescanning the batch of live event dicts at every allocation threshold
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        write_event_cache(iter_json_file(json_path), cache_directory(json_path), source_signature(json_path), source_hash)
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+def cache_is_fresh(json_path):
+    # The cache is valid if it has the current layout and the source json did not change
+    meta_path = os.path.join(cache_directory(json_path), META_FILE)
+
+    if not os.path.exists(meta_path):
+        return False
+
+    with open(meta_path, "r", encoding="utf-8") as f:
+        meta = json.load(f)
+
+    return meta.get("version") == CACHE_VERSION and meta.get("source") == source_signature(json_path)
+
+
+def event_source_hash(json_path):
+    # sha256 of the events json, read from the cache meta file when the cache is fresh
+    # (the events file itself is only stat-ed, not read)
+    if not cache_is_fresh(json_path):
+        build_event_cache(json_path)
+
+    with open(os.path.join(cache_directory(json_path), META_FILE), "r", encoding="utf-8") as f:
+        return json.load(f)["source_hash"]
+
+
+def open_event_cache(json_path):
+    # Columnar events of a competition, (re)built only when the source json changed
+    if not cache_is_fresh(json_path):
+        build_event_cache(json_path)
+
+    return EventCache(cache_directory(json_path))
+
+
+class EventCache:
+    # Memory-mapped columnar events of one competition
+
+    def __init__(self, directory, mmap_mode="r"):
+        self.directory = directory
+
+        with open(os.path.join(directory, META_FILE), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+
+        self.categories = self.meta["categories"]
+
+        self.columns = {
+            column: np.load(os.path.join(directory, f"{column}.npy"), mmap_mode=mmap_mode)
+            for column in list(NUMERIC_COLUMNS) + list(POSITION_COLUMNS) + CATEGORICAL_COLUMNS
+        }
+        self.tag_ids = np.load(os.path.join(directory, TAG_IDS_FILE), mmap_mode=mmap_mode)
+        self.tag_offsets = np.load(os.path.join(directory, TAG_OFFSETS_FILE), mmap_mode=mmap_mode)
+
+    def __len__(self):
+        return self.meta["rows"]
+
+    def code(self, column, value):
+        # Integer code of a categorical value (-1 if it never appears)
+        categories = self.categories[column]
+        return categories.index(value) if value in categories else -1
+
+    def mask(self, column, value):
+        # Boolean row mask of the events whose categorical column equals value
+        return np.asarray(self.columns[column]) == self.code(column, value)
+
+    def column(self, column, rows=None):
+        # One column as numpy array (categorical columns as pandas Categorical)
+        values = self.columns[column]
+        values = np.asarray(values if rows is None else values[rows])
+
+        if column in self.categories:
+            return pd.Categorical.from_codes(values, categories=self.categories[column])
+
+        return values
+
+    def frame(self, columns, rows=None):
+        # DataFrame with the requested columns, optionally restricted to rows (mask or positions)
+        return pd.DataFrame({column: self.column(column, rows) for column in columns})
+
+    def tags(self, row):
+        # Tag ids of a single event
+        return self.tag_ids[self.tag_offsets[row]:self.tag_offsets[row + 1]]
+
+    def tag_matrix(self, tags):
+        # Boolean (events, len(tags)) matrix, [i, j] is True if event i has tag tags[j].
+        # Decodes the packed tag lists of all the events at once
+        tags = np.asarray(tags, dtype=np.int32)
+        matrix = np.zeros((len(self), len(tags)), dtype=bool)
+        if len(tags) == 0:
+            return matrix
+
+        order = np.argsort(tags)
+        sorted_tags = tags[order]
+
+        tag_ids = np.asarray(self.tag_ids)
+        events = np.repeat(np.arange(len(self)), np.diff(self.tag_offsets))
+
+        positions = np.minimum(np.searchsorted(sorted_tags, tag_ids), len(tags) - 1)
+        found = sorted_tags[positions] == tag_ids
+        matrix[events[found], order[positions[found]]] = True
+
+        return matrix
+
+
+def load_events(json_path, columns, event_name=None, tags=()):
+    # Typed, low-memory events of a competition with only the columns a consumer needs:
+    # names as pandas categoricals, ids as int32, positions as fixed-width integers.
+    # event_name keeps only the events of that eventName (filtered on the integer codes),
+    # every tag in tags adds a boolean column "tag_{id}"
+    cache = open_event_cache(json_path)
+    rows = None if event_name is None else cache.mask("eventName", event_name)
+
+    events = cache.frame(columns, rows=rows)
+
+    if len(tags):
+        tag_matrix = cache.tag_matrix(tags)
+        if rows is not None:
+            tag_matrix = tag_matrix[rows]
+
+        for j, tag in enumerate(tags):
+            events[f"tag_{tag}"] = tag_matrix[:, j]
+
+    return events
@@ -0,0 +1,21 @@
+# Event statistics of the players table (see player_table_loader.py): statistic -> (eventName, tag ids).
+# An event counts if it has the eventName (None = any event) and any of the tags (None = no tag needed).
+# Every statistic is an Integer column of Models/Player.py, a new statistic is a new entry here
+# (databases created before it get its column, see database.add_missing_columns)
+
+# WYSCOUT TAG-ID LIST:  https://dataglossary.wyscout.com/
+EVENT_STATISTICS = {
+    # passes (any kind)
+    "total_passes": ("Pass", None),
+    # accurate pass
+    "completed_passes": ("Pass", [1801]),
+    # pass is also an assist
+    "assists": ("Pass", [301]),
+    # shot was also a goal
+    "goals": ("Shot", [101]),
+    # fouls
+    "fouls_committed": ("Foul", None),
+    # cards (yellow, red / second yellow)
+    "yellow_cards": (None, [1702]),
+    "red_cards": (None, [1701, 1703])
+}
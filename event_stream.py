@@ -0,0 +1,121 @@
+import io
+import itertools
+import json
+import os
+import zipfile
+
+
+RAW_DATA_PATH = "RawData"
+
+# Characters read from the source at a time, the buffer never holds much more than this
+STREAM_CHUNK_SIZE = 1 << 20
+
+_WHITESPACE = " \t\r\n"
+
+# Characters that can follow a complete element of the array
+_ELEMENT_END = _WHITESPACE + ",]"
+
+
+def iter_json_array(f, chunk_size=STREAM_CHUNK_SIZE):
+    # Yield the elements of a top level json array one by one from a text file,
+    # keeping only one chunk (plus the element being decoded) in memory
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    started = False
+
+    while True:
+        # skip separators between the elements
+        while pos < len(buffer) and (buffer[pos] in _WHITESPACE or (started and buffer[pos] == ",")):
+            pos += 1
+
+        if pos == len(buffer):
+            buffer = f.read(chunk_size)
+            pos = 0
+            if not buffer:
+                raise ValueError("Unexpected end of json array")
+            continue
+
+        if not started:
+            if buffer[pos] != "[":
+                raise ValueError("Expected a json array")
+            started = True
+            pos += 1
+            continue
+
+        if buffer[pos] == "]":
+            return
+
+        try:
+            element, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            # element cut by the end of the chunk, read more and retry
+            chunk = f.read(chunk_size)
+            if not chunk:
+                raise
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            continue
+
+        if end == len(buffer) or buffer[end] not in _ELEMENT_END:
+            # a number cut by the end of the chunk also decodes ("123" of "12345", "1" of "1e-7"):
+            # an element is complete only when a separator follows it, otherwise decode it again
+            # with more text (unless the file is over, the error is then raised on the next element)
+            chunk = f.read(chunk_size)
+            if chunk:
+                buffer = buffer[pos:] + chunk
+                pos = 0
+                continue
+
+        yield element
+        pos = end
+
+        # drop what was already decoded
+        if pos > chunk_size:
+            buffer = buffer[pos:]
+            pos = 0
+
+
+def find_raw_member(member, raw_data_path=RAW_DATA_PATH):
+    # Path of the zip archive in RawData/ that contains member (e.g. events_Italy.json)
+    for name in sorted(os.listdir(raw_data_path)):
+        if not name.endswith(".zip"):
+            continue
+
+        zip_path = os.path.join(raw_data_path, name)
+        with zipfile.ZipFile(zip_path) as archive:
+            if member in archive.namelist():
+                return zip_path
+
+    raise FileNotFoundError(f"{member} not found in any archive of {raw_data_path}")
+
+
+def iter_zip_json_array(zip_path, member, chunk_size=STREAM_CHUNK_SIZE):
+    # Stream a json array straight from a zip member, no extraction needed
+    with zipfile.ZipFile(zip_path) as archive:
+        with archive.open(member) as raw:
+            with io.TextIOWrapper(raw, encoding="utf-8") as f:
+                yield from iter_json_array(f, chunk_size=chunk_size)
+
+
+def iter_json_file(json_path, chunk_size=STREAM_CHUNK_SIZE):
+    # Stream a json array from an extracted file
+    with open(json_path, "r", encoding="utf-8") as f:
+        yield from iter_json_array(f, chunk_size=chunk_size)
+
+
+def iter_raw_json(member, raw_data_path=RAW_DATA_PATH):
+    # Stream any raw file (events, matches, players...) from the RawData archives
+    return iter_zip_json_array(find_raw_member(member, raw_data_path), member)
+
+
+def iter_competition_events(competition, raw_data_path=RAW_DATA_PATH):
+    # Events of a competition, one dict at a time, read directly from the zip
+    return iter_raw_json(f"events_{competition}.json", raw_data_path)
+
+
+def group_by_match(events):
+    # Group consecutive events by matchId: yields (match_id, list of that match's events).
+    # Wyscout files store the events of a match contiguously, so only one match is in memory
+    for match_id, match_events in itertools.groupby(events, key=lambda event: event["matchId"]):
+        yield match_id, list(match_events)
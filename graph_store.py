@@ -0,0 +1,248 @@
+import json
+import os
+import shutil
+import time
+import numpy as np
+import pandas as pd
+
+import instrumentation
+from event_cache import cache_directory, load_events, open_event_cache
+from event_stream import group_by_match
+from pass_network import GRAPH_KEYS, PassNetwork, pass_edge_list
+from possession import ACCURATE_PASS_TAG, CHAIN_COLUMN, POSSESSION_CHAINS, event_chains, stream_chains
+
+
+# Pass networks of a competition saved as compact edge lists, so the metric runs and the
+# graph-level analysis read the graphs directly instead of the events.
+#
+#   graph_store = GraphStore.from_json("Data/Events/events_Italy.json")
+#   network = graph_store.network(match_id, team_id)                          # PassNetwork
+#   completed = graph_store.network(match_id, team_id, weight="completed")    # accurate passes only
+#   graph_store = GraphStore.from_stream(iter_competition_events("Italy"))    # straight from the zip
+#
+# The edges of every (match, team) graph are one contiguous slice of a single structured .npy
+# file (memory mapped), the index file holds the offsets of the slices. The store is built from
+# the columnar event cache the first time and saved inside it, so it is rebuilt with the cache
+# when the events json changes. Once built, the events json is only stat-ed (and not even that
+# if it was removed). With POSSESSION_CHAINS only the passes of the same possession chain
+# are paired (see possession.py).
+
+# One record per edge: passer -> receiver, pairs of consecutive passes and how many of
+# them started with an accurate pass (tag 1801)
+EDGE_DTYPE = np.dtype([
+    ("passer", np.int32),
+    ("receiver", np.int32),
+    ("weight", np.uint16),
+    ("completed", np.uint16)
+])
+
+# Bump when the way the edges are built changes, older stores are then rebuilt
+GRAPH_STORE_VERSION = 1
+
+# Sub directory of the event cache holding the store
+GRAPHS_DIRECTORY = "graphs"
+
+EDGES_FILE = "edges.npy"
+# (matchId, teamId, start, stop) rows of the edges of every graph
+INDEX_FILE = "index.npy"
+META_FILE = "meta.json"
+
+
+def graph_store_directory(json_path):
+    return os.path.join(cache_directory(json_path), GRAPHS_DIRECTORY)
+
+
+def edge_set():
+    # Identifies how the edges are built, stores built another way are rebuilt
+    return f"v{GRAPH_STORE_VERSION}|chains={POSSESSION_CHAINS}"
+
+
+def graph_store_is_fresh(directory):
+    # The store is complete (the meta file is written last) and its edges are built the current way
+    meta_path = os.path.join(directory, META_FILE)
+
+    if not os.path.exists(meta_path):
+        return False
+
+    with open(meta_path, "r", encoding="utf-8") as f:
+        return json.load(f).get("edge_set") == edge_set()
+
+
+class GraphStore:
+    # Edge lists of the pass networks of a competition indexed by (matchId, teamId)
+
+    def __init__(self, edges, index, directory=None, source_hash=None):
+        # edges: EDGE_DTYPE records of all the graphs, grouped by graph
+        # index: (matchId, teamId) -> (start, stop) rows in the edges
+        # directory: where the store is saved, if it is backed by files
+        # source_hash: sha256 of the events json the graphs come from, if known
+        self.edges = edges
+        self._index = index
+        self.directory = directory
+        self.source_hash = source_hash
+
+    @classmethod
+    def from_json(cls, json_path):
+        # Graphs of a competition, built from its event cache the first time
+        # and memory-mapped from the saved store afterwards
+        start = time.perf_counter()
+        directory = graph_store_directory(json_path)
+
+        cache = None
+        if os.path.exists(json_path):
+            # a rebuilt event cache drops the store built from the previous events
+            cache = open_event_cache(json_path)
+        parsed = time.perf_counter()
+
+        cached = graph_store_is_fresh(directory)
+        if not cached and cache is None:
+            raise FileNotFoundError(
+                f"{json_path} not found, and the graph store in {directory} is missing or built another way"
+            )
+        if not cached:
+            passes = load_events(json_path, GRAPH_KEYS + ["playerId"], event_name="Pass", tags=[ACCURATE_PASS_TAG])
+            chain_column = None
+            if POSSESSION_CHAINS:
+                passes[CHAIN_COLUMN] = event_chains(cache)[cache.mask("eventName", "Pass")]
+                chain_column = CHAIN_COLUMN
+
+            tmp_directory = directory + ".tmp"
+            shutil.rmtree(tmp_directory, ignore_errors=True)
+            graph_store = cls.from_passes(passes, completed_column=f"tag_{ACCURATE_PASS_TAG}", chain_column=chain_column)
+            graph_store.source_hash = cache.meta["source_hash"]
+            graph_store.save(tmp_directory)
+            shutil.rmtree(directory, ignore_errors=True)
+            os.replace(tmp_directory, directory)
+
+        graph_store = cls.load(directory)
+
+        instrumentation.record(
+            "load",
+            json_path=json_path,
+            events=0 if cache is None else len(cache),
+            graphs=len(graph_store),
+            edges=len(graph_store.edges),
+            graphs_cached=cached,
+            parse_seconds=parsed - start,
+            graph_store_seconds=time.perf_counter() - parsed
+        )
+        return graph_store
+
+    @classmethod
+    def from_stream(cls, events):
+        # Graphs of a competition from an event generator (e.g. event_stream.iter_competition_events,
+        # read straight from the zip), one match at a time: only the events of the current match and
+        # the edges of the previous ones are in memory. Same graphs as from_json, nothing is saved
+        completed_column = f"tag_{ACCURATE_PASS_TAG}"
+        edges = []
+        index = {}
+        n_edges = 0
+
+        for match_id, match_events in group_by_match(events):
+            passes = pd.DataFrame(
+                [
+                    (event["matchId"], event["teamId"], event["playerId"],
+                     any(tag["id"] == ACCURATE_PASS_TAG for tag in event["tags"]))
+                    for event in match_events
+                    if event["eventName"] == "Pass"
+                ],
+                columns=GRAPH_KEYS + ["playerId", completed_column]
+            )
+            chain_column = None
+            if POSSESSION_CHAINS:
+                is_pass = np.array([event["eventName"] == "Pass" for event in match_events], dtype=bool)
+                passes[CHAIN_COLUMN] = stream_chains(match_events)[is_pass]
+                chain_column = CHAIN_COLUMN
+
+            match_store = cls.from_passes(passes, completed_column=completed_column, chain_column=chain_column)
+            edges.append(match_store.edges)
+            for key, (start, stop) in match_store._index.items():
+                index[key] = (start + n_edges, stop + n_edges)
+            n_edges += len(match_store.edges)
+
+        return cls(np.concatenate(edges) if edges else np.zeros(0, dtype=EDGE_DTYPE), index)
+
+    @classmethod
+    def from_passes(cls, passes, completed_column=None, chain_column=None):
+        # Store from passes (matchId, teamId, playerId in event order), all the graphs in one
+        # batched edge list. Without a completed_column the completed counts are 0,
+        # with a chain_column only the passes of the same chain are paired
+        edge_list = pass_edge_list(passes, GRAPH_KEYS, completed_column, chain_column)
+
+        edges = np.zeros(len(edge_list), dtype=EDGE_DTYPE)
+        edges["passer"] = edge_list["passer"].to_numpy()
+        edges["receiver"] = edge_list["receiver"].to_numpy()
+        edges["weight"] = edge_list["weight"].to_numpy()
+        if completed_column is not None:
+            edges["completed"] = edge_list["completed"].to_numpy()
+
+        # the edges of a graph are contiguous (pass pairs are grouped by graph before counting)
+        match_ids = edge_list["matchId"].to_numpy()
+        team_ids = edge_list["teamId"].to_numpy()
+        changes = (match_ids[1:] != match_ids[:-1]) | (team_ids[1:] != team_ids[:-1])
+        starts = np.flatnonzero(np.r_[len(edges) > 0, changes])
+        stops = np.r_[starts[1:], len(edges)]
+
+        index = {
+            (int(match_ids[start]), int(team_ids[start])): (int(start), int(stop))
+            for start, stop in zip(starts, stops)
+        }
+
+        return cls(edges, index)
+
+    def save(self, directory):
+        # The edges file, the offset index and the meta file (written last, marks the store complete)
+        os.makedirs(directory, exist_ok=True)
+
+        np.save(os.path.join(directory, EDGES_FILE), self.edges)
+
+        index = np.array(
+            [(match_id, team_id, start, stop) for (match_id, team_id), (start, stop) in self._index.items()],
+            dtype=np.int64
+        ).reshape(-1, 4)
+        np.save(os.path.join(directory, INDEX_FILE), index)
+
+        with open(os.path.join(directory, META_FILE), "w", encoding="utf-8") as f:
+            json.dump({"edge_set": edge_set(), "source_hash": self.source_hash}, f)
+
+    @classmethod
+    def load(cls, directory, mmap_mode="r"):
+        # Open a saved store; with mmap_mode the edges are shared through the page cache
+        with open(os.path.join(directory, META_FILE), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+
+        index = {
+            (int(match_id), int(team_id)): (int(start), int(stop))
+            for match_id, team_id, start, stop in np.load(os.path.join(directory, INDEX_FILE))
+        }
+
+        return cls(
+            np.load(os.path.join(directory, EDGES_FILE), mmap_mode=mmap_mode),
+            index,
+            directory=directory,
+            source_hash=meta["source_hash"]
+        )
+
+    def __len__(self):
+        return len(self._index)
+
+    def keys(self):
+        # (matchId, teamId) of every stored graph
+        return list(self._index)
+
+    def team_edges(self, match_id, team_id):
+        # Edge records of one team in one match (empty if the team has no pass pair)
+        start, stop = self._index.get((int(match_id), int(team_id)), (0, 0))
+        return self.edges[start:stop]
+
+    def network(self, match_id, team_id, weight="weight"):
+        # PassNetwork of one team in one match, nodes in order of first appearance.
+        # weight="completed" keeps only the pairs started by an accurate pass
+        edges = np.asarray(self.team_edges(match_id, team_id))
+        if weight != "weight":
+            edges = edges[edges[weight] > 0]
+
+        return PassNetwork.from_edges(edges["passer"], edges["receiver"], edges[weight])
+
+    def networks(self, graph_keys, weight="weight"):
+        return [self.network(match_id, team_id, weight) for match_id, team_id in graph_keys]
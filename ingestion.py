@@ -0,0 +1,250 @@
+import queue
+import signal
+import threading
+from multiprocessing import Event, Process, Queue, parent_process
+
+import instrumentation
+from database import GraphStatisticWriter, init_db, stored_fingerprints
+
+
+# Single writer for a database: metric and player table writes of any number of producers
+# go through one queue to one process, the only one writing the database.
+#
+#   with Ingestion(database_url) as writer:       # starts the writer process
+#       writer.add_match(...)                     # same interface as GraphStatisticWriter
+#       writer.save_players(rows)
+#
+# The queue is bounded: producers faster than the database wait for it (backpressure).
+# A failed write stops all the later writes and is raised to the producers as an IngestionError.
+#
+# One Ingestion serializes the writes of one command (run_all shares it between the stages of a
+# competition). Independent commands, e.g. two season runs or a season next to a standalone
+# player_table_loader.py, each open their own writer: between them the only protection is SQLite,
+# WAL and busy_timeout make a writer wait for the commit of the other instead of failing, and only
+# the graph writers derive node_data (derive_node_data). Two season runs of the same database
+# are not coordinated beyond that, run them one after the other.
+
+# Messages waiting for the writer, producers block when the queue is full
+INGESTION_QUEUE_SIZE = 32
+
+# Player rows of graphs a producer collects before sending them as one message
+INGESTION_BATCH_SIZE = 5000
+
+# Seconds between two checks of the writer while a producer is blocked on it
+INGESTION_POLL_INTERVAL = 1.0
+
+
+class IngestionError(Exception):
+    # A write sent to the ingestion writer failed, or the writer stopped unexpectedly
+    pass
+
+
+def _receive(messages, received):
+    # Reader thread of the writer process: moves the messages of the queue to `received`.
+    # A read of the queue blocks for good on a message its producer died writing
+    # (the writer holds the write end of the pipe too, it never reaches end of file),
+    # so only this thread reads it and the writer loop keeps watching the owner
+    while True:
+        message = messages.get()
+        received.put(message)
+        if message[0] == "stop":
+            return
+
+
+def _writer_loop(database_url, messages, replies, failed, instrumentation_settings, derive_node_data):
+    # Body of the writer process. Messages are applied in arrival order; the graphs are
+    # committed when the writer batch is full or the queue runs empty, so a busy queue
+    # is written in large transactions and an idle one does not keep rows pending.
+    # Ctrl-C and SIGTERM are left to the owner, which then stops the writer after its last rows;
+    # if the owner dies the writer commits the messages it received whole and exits
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    owner = parent_process()
+
+    instrumentation.configure(**instrumentation_settings)
+    instrumentation.drain()
+
+    received = queue.Queue()
+    threading.Thread(target=_receive, args=(messages, received), name="ingestion_receive", daemon=True).start()
+
+    try:
+        writer = GraphStatisticWriter(database_url, derive_node_data=derive_node_data)
+    except Exception as e:
+        failed.set()
+        replies.put((f"{type(e).__name__}: {e}", instrumentation.drain()))
+        return
+
+    error = None
+
+    def apply(function, *args):
+        # after a failure the messages are still consumed (producers never block on
+        # a dead queue) but nothing else is written
+        nonlocal error
+        if error is not None:
+            return
+        try:
+            function(*args)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            failed.set()
+
+    try:
+        while True:
+            try:
+                message = received.get_nowait()
+            except queue.Empty:
+                apply(writer.flush)
+                message = None
+
+            while message is None:
+                try:
+                    message = received.get(timeout=INGESTION_POLL_INTERVAL)
+                except queue.Empty:
+                    if not owner.is_alive():
+                        message = ("stop", None)
+
+            kind, payload = message
+
+            if kind == "graphs":
+                for match_id, team_id, rows, fingerprint in payload:
+                    apply(writer.add_match, match_id, team_id, rows, fingerprint)
+            elif kind == "players":
+                apply(writer.save_players, payload)
+            elif kind == "sync":
+                apply(writer.flush)
+                replies.put((error, instrumentation.drain()))
+            elif kind == "stop":
+                apply(writer.flush)
+                if writer.derive_node_data and writer.node_data_stale:
+                    apply(writer.refresh_node_data)
+                break
+    finally:
+        writer.session.close()
+        writer.engine.dispose()
+
+    replies.put((error, instrumentation.drain()))
+
+
+class IngestionClient:
+    # Producer side of an Ingestion: buffers graph rows and sends them to the writer in batches
+
+    def __init__(self, database_url, messages, failed, batch_size=INGESTION_BATCH_SIZE):
+        self.database_url = database_url
+        self.messages = messages
+        self.failed = failed
+        self.batch_size = batch_size
+
+        self.pending = []
+        self.pending_count = 0
+
+    def send(self, kind, payload=None):
+        # Put a message on the queue, waiting while it is full (backpressure)
+        while True:
+            if self.failed.is_set():
+                raise IngestionError(f"ingestion writer of {self.database_url} failed, write not accepted")
+            try:
+                self.messages.put((kind, payload), timeout=INGESTION_POLL_INTERVAL)
+                return
+            except queue.Full:
+                pass
+
+    def stored_fingerprints(self):
+        # (match_id, team_id) -> fingerprint of every graph already stored, read without the writer
+        return stored_fingerprints(self.database_url)
+
+    def add_match(self, match_id, team_id, rows, fingerprint=None):
+        # rows: (player_id, score of every metric in SCORE_COLUMNS order) of one team in one match
+        self.pending.append((int(match_id), int(team_id), list(rows), fingerprint))
+
+        self.pending_count += len(rows) + 1
+        if self.pending_count >= self.batch_size:
+            self.send_pending()
+
+    def send_pending(self):
+        if not self.pending:
+            return
+
+        self.send("graphs", self.pending)
+        self.pending = []
+        self.pending_count = 0
+
+    def flush(self):
+        self.send_pending()
+
+    def save_players(self, rows):
+        # Players table rows (dicts with every Player column), upserted in one transaction
+        self.send("players", list(rows))
+
+    def close(self):
+        self.send_pending()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class Ingestion(IngestionClient):
+    # Owner of the writer process of one database. flush() waits until everything sent
+    # so far is committed (and raises the first failed write), close() also derives node_data
+    # unless derive_node_data is False (writers of the players table only, see GraphStatisticWriter)
+
+    def __init__(self, database_url, queue_size=INGESTION_QUEUE_SIZE, batch_size=INGESTION_BATCH_SIZE,
+                 derive_node_data=True):
+        super().__init__(database_url, Queue(queue_size), Event(), batch_size)
+        self.replies = Queue()
+        self.error_reported = False
+        self.closed = False
+
+        # tables created before any producer or the writer touches the database
+        init_db(database_url).dispose()
+
+        self.process = Process(
+            target=_writer_loop,
+            args=(database_url, self.messages, self.replies, self.failed, instrumentation.settings(), derive_node_data),
+            name="ingestion_writer",
+            daemon=True
+        )
+        self.process.start()
+
+    def wait_reply(self):
+        # Reply of the writer; raises the first failed write (once) or if the writer stopped
+        while True:
+            try:
+                error, records = self.replies.get(timeout=INGESTION_POLL_INTERVAL)
+                break
+            except queue.Empty:
+                if not self.process.is_alive():
+                    raise IngestionError(
+                        f"ingestion writer of {self.database_url} exited with code {self.process.exitcode}"
+                    )
+
+        # timings of the writes (see instrumentation.py) are recorded in the writer process
+        instrumentation.collect(records)
+
+        if error is not None and not self.error_reported:
+            self.error_reported = True
+            raise IngestionError(f"write to {self.database_url} failed: {error}")
+
+    def flush(self):
+        self.send_pending()
+        self.send("sync")
+        self.wait_reply()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+
+        try:
+            self.send_pending()
+        finally:
+            if self.process.is_alive():
+                # sent even after a failure: the writer keeps consuming until it stops
+                self.messages.put(("stop", None))
+            else:
+                self.messages.cancel_join_thread()
+
+            self.wait_reply()
+            self.process.join()
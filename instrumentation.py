@@ -0,0 +1,187 @@
+import cProfile
+import json
+import os
+import pstats
+import time
+import uuid
+from contextlib import contextmanager
+
+
+# Optional timing and counters of the metrics pipeline.
+# When enabled, every stage appends a structured record (one dict) to an in-memory buffer:
+#   load   - graph store opened, built from the events the first time (events, graphs, edges, parse_seconds, graph_store_seconds)
+#   graph  - one (match, team) network built from its edge list (passes, nodes, edges, build_seconds)
+#   batch  - metrics of a batch of graphs (graphs, nodes, one {name}_seconds per metric and intermediate)
+#   flush  - one writer transaction (graphs, rows, db_write_seconds)
+#   node_data - node_data derived again (players, node_data_seconds)
+#   run    - totals of a season or match run, written last
+# end_run appends the records of the run to a json lines file.
+# Pool workers send their records back with the results, so the file has a single writer.
+#
+# Turned on with configure() (run_all.py --instrument) or from the environment:
+#   GRAPH_METRICS_INSTRUMENT=1 python main.py
+#   GRAPH_METRICS_PROFILE_MATCH=2576335 python main.py
+
+INSTRUMENTATION_PATH = "Results/instrumentation.jsonl"
+
+# cProfile output of the profiled match, and number of functions printed
+PROFILE_PATH = "Results/profile_{match_id}.prof"
+PROFILE_TOP = 25
+
+INSTRUMENTATION_ENV = "GRAPH_METRICS_INSTRUMENT"
+PROFILE_MATCH_ENV = "GRAPH_METRICS_PROFILE_MATCH"
+
+_settings = {
+    "enabled": os.environ.get(INSTRUMENTATION_ENV, "") not in ("", "0"),
+    "path": INSTRUMENTATION_PATH,
+    "profile_match_id": int(os.environ[PROFILE_MATCH_ENV]) if os.environ.get(PROFILE_MATCH_ENV) else None
+}
+
+# records of this process not written yet
+_records = []
+
+# run in progress: id, start time and fields of its "run" record
+_run = None
+
+
+def configure(enabled=True, path=INSTRUMENTATION_PATH, profile_match_id=None):
+    _settings["enabled"] = enabled
+    _settings["path"] = path
+    _settings["profile_match_id"] = None if profile_match_id is None else int(profile_match_id)
+
+
+def settings():
+    # Current settings, passed to the pool workers so they record the same way
+    return dict(_settings)
+
+
+def enabled():
+    return _settings["enabled"]
+
+
+def record(record_type, **fields):
+    if not _settings["enabled"]:
+        return
+
+    _records.append({"type": record_type, "pid": os.getpid(), "time": time.time(), **fields})
+
+
+def drain():
+    # Take the buffered records (workers send them back with their results)
+    records = _records[:]
+    del _records[:]
+    return records
+
+
+def collect(records):
+    # Add the records received from a worker
+    _records.extend(records)
+
+
+def start_run(**fields):
+    global _run
+
+    if not _settings["enabled"]:
+        return
+
+    _run = {"run_id": uuid.uuid4().hex, "start": time.perf_counter(), "fields": fields}
+
+
+def run_totals(records):
+    # Stage durations and counters of a list of records
+    stages = {}
+    for r in records:
+        for key, value in r.items():
+            if key.endswith("_seconds"):
+                stage = key[:-len("_seconds")]
+                stages[stage] = stages.get(stage, 0.0) + value
+
+    def total(record_type, field):
+        return sum(r.get(field, 0) for r in records if r["type"] == record_type)
+
+    counters = {
+        "events": total("load", "events"),
+        "graphs": sum(1 for r in records if r["type"] == "graph"),
+        "passes": total("graph", "passes"),
+        "nodes": total("graph", "nodes"),
+        "edges": total("graph", "edges"),
+        "rows_written": total("flush", "rows"),
+        "transactions": sum(1 for r in records if r["type"] == "flush")
+    }
+
+    return {key: round(value, 6) for key, value in stages.items()}, counters
+
+
+def end_run(**fields):
+    # Close the run: append its records and a "run" record with the totals to the json lines file.
+    # Records buffered before the run started (e.g. the events loaded for it) belong to it too
+    global _run
+
+    if not _settings["enabled"] or _run is None:
+        return None
+
+    records = drain()
+
+    stages, counters = run_totals(records)
+    summary = {
+        "type": "run",
+        "pid": os.getpid(),
+        "time": time.time(),
+        "seconds": round(time.perf_counter() - _run["start"], 6),
+        "stages": stages,
+        "counters": counters,
+        **_run["fields"],
+        **fields
+    }
+
+    for r in records:
+        r["run_id"] = _run["run_id"]
+    summary["run_id"] = _run["run_id"]
+    _run = None
+
+    write_records(records + [summary])
+    return summary
+
+
+def write_records(records):
+    path = _settings["path"]
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    # one write per run, appends of different processes do not interleave
+    with open(path, "a", encoding="utf-8") as f:
+        f.write("".join(json.dumps(r) + "\n" for r in records))
+
+
+def profile_match_id():
+    return _settings["profile_match_id"]
+
+
+def is_profiled(match_id):
+    return _settings["profile_match_id"] is not None and int(match_id) == _settings["profile_match_id"]
+
+
+@contextmanager
+def profiled(match_id):
+    # Run the block under cProfile if match_id is the match to profile:
+    # the stats are saved to PROFILE_PATH and the top functions printed
+    if not is_profiled(match_id):
+        yield
+        return
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+
+        path = PROFILE_PATH.format(match_id=match_id)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        profiler.dump_stats(path)
+
+        print(f"Profile of match {match_id} written to {path}")
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(PROFILE_TOP)
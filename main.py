@@ -2,15 +2,14 @@ import json
 import os
 
 # import the graph statistics function
-from match_to_graphStats import match_to_graphStats
+from graph_store import GraphStore
+from ingestion import Ingestion
+from data_paths import MATCHES_DIRECTORY_PATH, TEAMS_PATH, events_path
+from metrics_cache import MetricsCache
+from season import compute_match, compute_season, interrupt_on_sigterm
 
-# The path to the json is the one specify in the 
-# estractRawData.cmd file
-
-MATCHES_DIRECTORY_PATH = "Data/matches/"
-EVENTS_DIRECTORY_PATH = "Data/Events/"
-TEAMS_PATH = "Data/Teams/teams.json"
-PLAYERS_PATH = "Data/Players/players.json"
+# The paths to the json files are the ones of the
+# extractRawData.cmd file (see data_paths.py)
 
 # ================================== LOAD TEAMS METADATA =============================================
 
@@ -92,6 +91,22 @@ def choose_match(matches):
             print("Invalid index, try again.")
 
 
+# Ask how many processes to use for a season computation
+def choose_workers():
+    default = os.cpu_count() or 1
+    print(f"\nNumber of worker processes (press enter for {default}, 1 = serial):")
+
+    while True:
+        choice = input("> ")
+
+        if choice == "":
+            return default
+        elif choice.isdigit() and int(choice) > 0:
+            return int(choice)
+        else:
+            print("Invalid number, try again.")
+
+
 def main():
     while True:    
         print("\nSelect analysis mode:")
@@ -108,77 +123,38 @@ def main():
             match_id = match["wyId"]
             print(f"\nRunning match statistics for matchId={match_id} ({competition})")
 
-            # Covert each team stats to graphs compute and save the stats
-            #search if the db already exists to computte again or not
-            compute = True;
-            if os.path.exists(f"Databases/Data_{competition}_{match_id}.db"):
-                while True:
-                    print("Database for match already generated")
-                    print("Overwrite previus Database? (y/n)")
-                    Overwrite = input("> ")
-                    if Overwrite == "y":
-                        os.remove(f"Databases/Data_{competition}_{match_id}.db")
-                        break;
-                    elif Overwrite == "n":
-                        compute = False;
-                        break;
-                    else:
-                        print("wrong selection")
-            #Only if is needed we compute the match statistics for new matches 
-            # Or in case of overwrite
-            if compute:
-                file_path = os.path.join(EVENTS_DIRECTORY_PATH, f"events_{competition}.json")
-                database_url = f"sqlite:///Databases/Data_{competition}_{match_id}.db"
-                teams = match["teamsData"]
-                team_ids = list(teams.keys())
-                team_a_id = team_ids[0]
-                team_b_id = team_ids[1]
-
-                match_to_graphStats(json_path=file_path, match_id=match_id , team_id = team_a_id ,database_url = database_url)
-                match_to_graphStats(json_path=file_path, match_id=match_id , team_id = team_b_id ,database_url = database_url)
+            # Covert each team stats to graphs compute and save the stats.
+            # Writing a match is idempotent, and teams already computed in any earlier
+            # run (this mode or the season one) are read from the metrics cache
+            file_path = events_path(competition)
+            database_url = f"sqlite:///Databases/Data_{competition}_{match_id}.db"
+            team_ids = list(match["teamsData"].keys())
+
+            with interrupt_on_sigterm(), MetricsCache() as metrics_cache, Ingestion(database_url) as writer:
+                compute_match(file_path, competition, match_id, team_ids, writer, metrics_cache)
 
         elif mode == "2":
             competition = choose_competition()
             matches = load_matches_for_competition(competition)
 
-            compute = True;
-            if os.path.exists(f"Databases/Data_{competition}.db"):
-                while True:
-                    print("Database for match already generated")
-                    print("Overwrite previus Database? (y/n)")
-                    Overwrite = input("> ")
-                    if Overwrite == "y":
-                        os.remove(f"Databases/Data_{competition}.db")
-                        break;
-                    elif Overwrite == "n":
-                        compute = False;
-                        break;
-                    else:
-                        print("wrong selection")
-
-            #Only if is needed we compute the match statistics for new matches 
-            # Or in case of overwrite
-            if compute:
-                file_path = os.path.join(EVENTS_DIRECTORY_PATH, f"events_{competition}.json")
-                database_url = f"sqlite:///Databases/Data_{competition}.db"
-                total = len(matches)
-                for i, match in enumerate(matches):
-                    teams = match["teamsData"]
-
-                    team_ids = list(teams.keys())
-                    team_a_id = team_ids[0]
-                    team_b_id = team_ids[1]
-                    team_a = TEAM_ID_TO_NAME.get(team_a_id, f"Team {team_a_id}")
-                    team_b = TEAM_ID_TO_NAME.get(team_b_id, f"Team {team_b_id}")
-                    score_a = teams[team_a_id]["score"]
-                    score_b = teams[team_b_id]["score"]
-
-                    print(f"computing {team_a} vs {team_b} ({score_a}-{score_b})")
-                    match_to_graphStats(json_path=file_path, match_id=match["wyId"] , team_id = team_a_id ,database_url = database_url)
-                    match_to_graphStats(json_path=file_path, match_id=match["wyId"] , team_id = team_b_id ,database_url = database_url)
-                    
-                    percent = ((i+1)/total)*100
-                    print(f"computation {percent}% done")
+            # The season database is updated in place: matches already stored
+            # are skipped, only new or changed matches are computed
+            file_path = events_path(competition)
+            database_url = f"sqlite:///Databases/Data_{competition}.db"
+
+            workers = choose_workers()
+
+            # pass networks of the whole season, built from the events the first time
+            print(f"Loading pass networks for {competition}...")
+            graph_store = GraphStore.from_json(file_path)
+
+            # one engine and one session for the whole season
+            # SIGTERM is handled until the writer is closed, the last rows are committed
+            with interrupt_on_sigterm(), MetricsCache() as metrics_cache, Ingestion(database_url) as writer:
+                compute_season(
+                    graph_store, matches, writer, workers=workers,
+                    metrics_cache=metrics_cache, competition=competition
+                )
 
 
         else:
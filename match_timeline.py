@@ -0,0 +1,143 @@
+import argparse
+import json
+import os
+import numpy as np
+import pandas as pd
+
+from centrality import batched_betweenness, batched_pagerank
+from data_paths import events_path, matches_path
+from event_cache import open_event_cache
+from metrics import PATH_INVERSE_WEIGHTS
+from pass_network import sliding_pass_networks
+from possession import CHAIN_COLUMN, POSSESSION_CHAINS, event_chains
+
+
+# Centrality of the players during a match, on a sliding time window of passes.
+#
+#   python match_timeline.py Italy 2576335 --window 600 --step 30
+#
+# writes one row per (team, window, player) to Results/timeline_{competition}_{match_id}.csv.
+# The passes of the match are read from the columnar event cache, with the possession chains
+# saved there for the graph store (see possession.event_chains)
+
+TIMELINE_PATH = "Results/timeline_{competition}_{match_id}.csv"
+
+# Length of the window and time between two windows (seconds of match clock)
+WINDOW_SECONDS = 600
+WINDOW_STEP_SECONDS = 30
+
+TIMELINE_COLUMNS = ["start", "end", "player_id", "degree", "pagerank", "betweenness"]
+
+# Seconds since kick-off of every pass
+CLOCK_COLUMN = "matchSec"
+
+# Order of the periods inside a match (eventSec restarts at each of them)
+PERIOD_ORDER = ["1H", "2H", "E1", "E2", "P"]
+
+
+def match_clock(match_ids, periods, seconds):
+    # Seconds since kick-off: the periods of a match are laid end to end,
+    # each one lasting up to its last event (stoppage time included)
+    rank = pd.Categorical(np.asarray(periods, dtype=object), categories=PERIOD_ORDER, ordered=True).codes
+    events = pd.DataFrame({"matchId": match_ids, "period": rank, "eventSec": seconds})
+
+    period_ends = events.groupby(["matchId", "period"])["eventSec"].max()
+    offsets = period_ends.groupby(level="matchId").cumsum() - period_ends
+
+    keys = pd.MultiIndex.from_arrays([events["matchId"], events["period"]])
+    return np.asarray(seconds, dtype=np.float64) + offsets.reindex(keys).to_numpy()
+
+
+def match_passes(cache, match_id):
+    # Passes of one match in event order: teamId, playerId, match clock and possession chain
+    rows = np.flatnonzero(np.asarray(cache.columns["matchId"]) == int(match_id))
+    is_pass = cache.mask("eventName", "Pass")[rows]
+
+    clock = match_clock(
+        np.full(len(rows), int(match_id)),
+        cache.column("matchPeriod", rows),
+        cache.column("eventSec", rows)
+    )
+
+    passes = cache.frame(["teamId", "playerId"], rows=rows[is_pass])
+    passes[CLOCK_COLUMN] = clock[is_pass]
+    passes[CHAIN_COLUMN] = np.asarray(event_chains(cache)[rows[is_pass]])
+    return passes
+
+
+def window_centrality(passes, window=WINDOW_SECONDS, step=WINDOW_STEP_SECONDS):
+    # Degree, PageRank and betweenness of every player in every window of one team in one match.
+    # The window networks are updated incrementally (see sliding_pass_networks).
+    # PageRank of a window starts from the scores of the previous window (new players start
+    # from the uniform score): consecutive windows share most of their passes, so it converges
+    # in a few iterations. Betweenness of all the windows is computed as one batch.
+    # Passes are paired inside their possession chain, like in the match graphs
+    chain_column = CHAIN_COLUMN if POSSESSION_CHAINS and CHAIN_COLUMN in passes else None
+    windows = list(sliding_pass_networks(passes, window, step, clock_column=CLOCK_COLUMN, chain_column=chain_column))
+    networks = [network for start, end, network in windows]
+
+    pageranks = []
+    previous = {}
+    for network in networks:
+        players = network.nodes()
+
+        if players:
+            nstart = [previous.get(player_id, 1.0 / len(players)) for player_id in players]
+            previous = batched_pagerank([network], nstart=[nstart])[0]
+        else:
+            previous = {}
+
+        pageranks.append(previous)
+
+    betweennesses = batched_betweenness(networks, inverse_weights=PATH_INVERSE_WEIGHTS)
+
+    rows = [
+        (start, end, player_id, degree, pagerank[player_id], betweenness[player_id])
+        for (start, end, network), pagerank, betweenness in zip(windows, pageranks, betweennesses)
+        for player_id, degree in zip(network.nodes(), network.degree().tolist())
+    ]
+
+    return pd.DataFrame(rows, columns=TIMELINE_COLUMNS)
+
+
+def match_timeline(cache, match_id, team_ids, window=WINDOW_SECONDS, step=WINDOW_STEP_SECONDS):
+    # Window centralities of both teams of a match in one frame
+    passes = match_passes(cache, match_id)
+    timelines = []
+
+    for team_id in team_ids:
+        team_passes = passes[passes["teamId"] == int(team_id)].reset_index(drop=True)
+        timeline = window_centrality(team_passes, window, step)
+        timeline.insert(0, "team_id", int(team_id))
+        timelines.append(timeline)
+
+    return pd.concat(timelines, ignore_index=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Player centrality on a sliding window of a match.")
+    parser.add_argument("competition")
+    parser.add_argument("match_id", type=int)
+    parser.add_argument("--window", type=float, default=WINDOW_SECONDS, help="window length in seconds")
+    parser.add_argument("--step", type=float, default=WINDOW_STEP_SECONDS, help="seconds between two windows")
+    args = parser.parse_args()
+
+    with open(matches_path(args.competition), "r", encoding="utf-8") as f:
+        matches = json.load(f)
+
+    match = next((match for match in matches if match["wyId"] == args.match_id), None)
+    if match is None:
+        raise SystemExit(f"No match {args.match_id} in {args.competition}")
+
+    cache = open_event_cache(events_path(args.competition))
+    timeline = match_timeline(cache, args.match_id, list(match["teamsData"].keys()), args.window, args.step)
+
+    output_path = TIMELINE_PATH.format(competition=args.competition, match_id=args.match_id)
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    timeline.to_csv(output_path, index=False)
+
+    print(f"{timeline[['team_id', 'end']].drop_duplicates().shape[0]} windows written to {output_path}")
+
+
+if __name__ == "__main__":
+    main()
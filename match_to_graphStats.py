@@ -1,48 +1,126 @@
-import json
-import pandas as pd
+import hashlib
+import time
+import numpy as np
 import networkx as nx
 
-from database import add_graph_statistic
-
-
-def match_to_graphStats(
-    json_path,
-    match_id,
-    team_id,
-    database_url
-):
-    # load json from file
-    with open(json_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-    df = pd.DataFrame(data)
-
-    # Filter data we only need passes to compute the statistics
-    df = df[df["matchId"] == int(match_id)]
-    df = df[df["teamId"] == int(team_id)]
-    passes = df[df["eventName"] == "Pass"]
-
-    # Build graph
-    G = nx.DiGraph()
-    for i in range(len(passes) - 1):
-        passer = passes.iloc[i]["playerId"]
-        receiver = passes.iloc[i + 1]["playerId"]
-
-        if G.has_edge(passer, receiver):
-            G[passer][receiver]["weight"] += 1
-        else:
-            G.add_edge(passer, receiver, weight=1)
-
-    # Extract metrics
-    betweenness = nx.betweenness_centrality(G, weight="weight")
-    pagerank = nx.pagerank(G, weight="weight")
-    degree = dict(G.degree(weight="weight"))
-
-    # Store Mach metrics in DB for future use
-    for player_id in G.nodes():
-        add_graph_statistic(
-            database_url=database_url,
-            player_id=player_id,
-            score_betweenness=betweenness.get(player_id, 0.0),
-            score_pagerank=pagerank.get(player_id, 0.0),
-            score_degree=degree.get(player_id, 0.0)
-        )
\ No newline at end of file
+import instrumentation
+from centrality import eigenvector_from_adjacency, stack_adjacency
+from graph_store import edge_set
+from pass_network import as_pass_network
+from metrics import METRIC_NAMES, PATH_INVERSE_WEIGHTS, compute_metrics
+
+
+# "batched": the metric registry (metrics.py), intermediates shared by all the metrics of a batch
+# "networkx": reference implementation, one networkx call per metric and per graph
+METRICS_BACKEND = "batched"
+
+
+# Bump when the way metrics are computed changes, so stored matches are recomputed
+METRICS_VERSION = 1
+
+
+def metric_set():
+    # Identifies the metrics computed and how (and how the graphs are built), part of the metrics cache key
+    return f"{','.join(METRIC_NAMES)}|v{METRICS_VERSION}|inverse={PATH_INVERSE_WEIGHTS}|edges={edge_set()}"
+
+
+def graph_fingerprint(graph_store, match_id, team_id):
+    # Identifies the input of one (match, team) graph and the metric settings:
+    # a stored match is computed again only if its fingerprint changed
+    h = hashlib.sha1(f"{metric_set()}|".encode())
+    edges = graph_store.team_edges(match_id, team_id)
+    for field in ("passer", "receiver", "weight"):
+        h.update(np.ascontiguousarray(edges[field], dtype=np.int64).tobytes())
+    return h.hexdigest()
+
+
+def inverse_pass_count(u, v, edge_data):
+    return 1.0 / edge_data["weight"]
+
+
+def networkx_eigenvector(G):
+    # nx.eigenvector_centrality; a graph it does not converge on gets the last iterate with a
+    # RuntimeWarning, like in the batched engine (networkx raises and would stop the whole run)
+    try:
+        return nx.eigenvector_centrality(G, weight="weight")
+    except nx.PowerIterationFailedConvergence:
+        network = as_pass_network(G)
+        W = stack_adjacency([network])[0]
+        return dict(zip(network.nodes(), eigenvector_from_adjacency(W, [len(network)])[0].tolist()))
+
+
+def networkx_metrics(G):
+    # Every registered metric of one networkx graph: name -> {player_id: value}
+    if len(G) == 0:
+        return {name: {} for name in METRIC_NAMES}
+
+    distance = inverse_pass_count if PATH_INVERSE_WEIGHTS else "weight"
+    reference = {
+        "betweenness": lambda: nx.betweenness_centrality(G, weight=distance),
+        "pagerank": lambda: nx.pagerank(G, weight="weight"),
+        "degree": lambda: dict(G.degree(weight="weight")),
+        "closeness": lambda: nx.closeness_centrality(G, distance=distance),
+        "eigenvector": lambda: networkx_eigenvector(G),
+        "harmonic": lambda: nx.harmonic_centrality(G, distance=distance)
+    }
+    return {name: reference[name]() for name in METRIC_NAMES}
+
+
+def graphs_statistics(graphs):
+    # Extract metrics of a batch of graphs (PassNetwork or networkx):
+    # for every graph one (player_id, score of every metric in METRIC_NAMES order) row per node
+    networks = [as_pass_network(G) for G in graphs]
+    start = time.perf_counter()
+
+    if METRICS_BACKEND == "batched":
+        values, seconds = compute_metrics(networks)
+
+        statistics = [
+            list(zip(network.nodes(), *(values[name][i].tolist() for name in METRIC_NAMES)))
+            for i, network in enumerate(networks)
+        ]
+    else:
+        statistics = []
+        for network in networks:
+            values = networkx_metrics(network.to_networkx())
+            statistics.append([
+                (player_id, *(values[name].get(player_id, 0.0) for name in METRIC_NAMES))
+                for player_id in network.nodes()
+            ])
+        seconds = {"networkx_seconds": time.perf_counter() - start}
+
+    instrumentation.record(
+        "batch",
+        graphs=len(networks),
+        nodes=sum(len(network) for network in networks),
+        **seconds
+    )
+
+    return statistics
+
+
+def matches_statistics(graph_store, graph_keys):
+    # Metrics of many (match_id, team_id) graphs computed as one batch.
+    # The edge lists of every team in every match are already in the graph store
+    networks = []
+
+    for match_id, team_id in graph_keys:
+        start = time.perf_counter()
+        network = graph_store.network(match_id, team_id)
+        networks.append(network)
+
+        instrumentation.record(
+            "graph",
+            match_id=int(match_id),
+            team_id=int(team_id),
+            passes=int(network.weights.sum()),
+            nodes=len(network),
+            edges=network.number_of_edges(),
+            build_seconds=time.perf_counter() - start
+        )
+
+    return graphs_statistics(networks)
+
+
+def match_statistics(graph_store, match_id, team_id):
+    return matches_statistics(graph_store, [(match_id, team_id)])[0]
@@ -0,0 +1,168 @@
+import time
+
+from centrality import (
+    betweenness_from_paths,
+    closeness_from_distances,
+    eigenvector_from_adjacency,
+    harmonic_from_distances,
+    pagerank_vectors,
+    shortest_path_counts,
+    shortest_path_lengths,
+    stack_adjacency,
+    stack_transition
+)
+from pass_network import as_pass_network
+
+
+# Registry of the player metrics computed on every (match, team) graph.
+# A metric declares the intermediates it is computed from (adjacency stack, all-pairs distances,
+# transition matrix...); an intermediate declares the ones it needs in turn. For every batch of
+# graphs each intermediate is computed once, only if a registered metric needs it, and shared by
+# all of them: closeness and harmonic reuse the distances of betweenness, eigenvector the adjacency.
+#
+# Every metric is stored as a score_{name} column of match_node_data and node_data
+# (see Models/MatchNodeData.py, missing columns are added to existing databases),
+# the rows of a graph are (player_id, score of every metric in METRIC_NAMES order).
+#
+# To add a metric:
+#   @metric("name", "Label in the plots", requires=["distances"])
+#   def name_metric(networks, distances): return one array per graph, in node order
+
+# Graphs computed together, bounds the (graphs, n, n, n) temporaries of the path metrics
+METRICS_BATCH_SIZE = 128
+
+# Edge length of the path metrics (betweenness, closeness, harmonic): False = pass count
+# (networkx default, the values stored so far), True = 1 / pass count, frequent combinations
+# become short paths
+PATH_INVERSE_WEIGHTS = False
+
+# name -> (required intermediates, function(networks, *required values))
+INTERMEDIATES = {}
+
+# name -> {"label", "requires", "function"}, in storage order
+METRICS = {}
+
+
+def intermediate(name, requires=()):
+    def register(function):
+        INTERMEDIATES[name] = (list(requires), function)
+        return function
+    return register
+
+
+def metric(name, label, requires=()):
+    def register(function):
+        METRICS[name] = {"label": label, "requires": list(requires), "function": function}
+        return function
+    return register
+
+
+def score_column(name):
+    return f"score_{name}"
+
+
+# ================================== INTERMEDIATES =============================================
+
+@intermediate("adjacency")
+def adjacency_stack(networks):
+    # (graphs, n, n) weighted adjacency, zero padded
+    return stack_adjacency(networks)[0]
+
+
+@intermediate("distances", requires=["adjacency"])
+def distances_stack(networks, W):
+    # all-pairs shortest path lengths and edge lengths
+    return shortest_path_lengths(W, inverse_weights=PATH_INVERSE_WEIGHTS)
+
+
+@intermediate("path_counts", requires=["distances"])
+def path_counts_stack(networks, distances):
+    # number of shortest paths between every pair
+    D, length = distances
+    return shortest_path_counts(D, length)
+
+
+@intermediate("transition")
+def transition_matrix(networks):
+    # row normalized block-diagonal transition matrix of the batch
+    return stack_transition(networks)
+
+
+# ================================== METRICS =============================================
+
+def unstack(networks, values):
+    # (graphs, n) padded values -> one array per graph, in node order
+    return [values[b, :len(network)] for b, network in enumerate(networks)]
+
+
+def sizes(networks):
+    return [len(network) for network in networks]
+
+
+@metric("betweenness", "Betweenness Centrality", requires=["distances", "path_counts"])
+def betweenness_metric(networks, distances, sigma):
+    return unstack(networks, betweenness_from_paths(distances[0], sigma, sizes(networks)))
+
+
+@metric("pagerank", "PageRank Centrality", requires=["transition"])
+def pagerank_metric(networks, transition):
+    return pagerank_vectors(networks, transition)
+
+
+@metric("degree", "Degree Centrality")
+def degree_metric(networks):
+    return [network.degree() for network in networks]
+
+
+@metric("closeness", "Closeness Centrality", requires=["distances"])
+def closeness_metric(networks, distances):
+    return unstack(networks, closeness_from_distances(distances[0], sizes(networks)))
+
+
+@metric("eigenvector", "Eigenvector Centrality", requires=["adjacency"])
+def eigenvector_metric(networks, W):
+    return unstack(networks, eigenvector_from_adjacency(W, sizes(networks)))
+
+
+@metric("harmonic", "Harmonic Centrality", requires=["distances"])
+def harmonic_metric(networks, distances):
+    return unstack(networks, harmonic_from_distances(distances[0]))
+
+
+METRIC_NAMES = list(METRICS)
+SCORE_COLUMNS = [score_column(name) for name in METRIC_NAMES]
+
+
+def compute_metrics(graphs, names=None):
+    # Metrics of a list of graphs (PassNetwork or networkx), computed batch by batch.
+    # Returns name -> one array per graph (in node order), and the seconds spent in every
+    # intermediate and metric ("{name}_seconds", intermediates counted once)
+    names = METRIC_NAMES if names is None else names
+    networks = [as_pass_network(G) for G in graphs]
+
+    values = {name: [] for name in names}
+    seconds = {}
+
+    def timed(name, function, *args):
+        start = time.perf_counter()
+        result = function(*args)
+        seconds[f"{name}_seconds"] = seconds.get(f"{name}_seconds", 0.0) + time.perf_counter() - start
+        return result
+
+    for start in range(0, len(networks), METRICS_BATCH_SIZE):
+        batch = networks[start:start + METRICS_BATCH_SIZE]
+        computed = {}
+
+        def resolve(name):
+            # an intermediate and the ones it needs, computed on first use
+            if name not in computed:
+                requires, function = INTERMEDIATES[name]
+                args = [resolve(required) for required in requires]
+                computed[name] = timed(name, function, batch, *args)
+            return computed[name]
+
+        for name in names:
+            args = [resolve(required) for required in METRICS[name]["requires"]]
+            values[name].extend(timed(name, METRICS[name]["function"], batch, *args))
+
+    return values, seconds
@@ -0,0 +1,125 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+
+# Metrics cache shared by the match and the season computations
+METRICS_CACHE_PATH = "Databases/metrics_cache.db"
+
+# Size limit of the cached payloads, the least recently used entries are evicted above it
+METRICS_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# Seconds a connection waits for another process writing to the cache (parallel competitions)
+METRICS_CACHE_TIMEOUT = 60
+
+
+def cache_key(competition, match_id, team_id, metric_set, source_hash):
+    # Content address of the metrics of one (match, team) graph:
+    # same competition, match, team, metric set and events source -> same metrics
+    identity = json.dumps([competition, int(match_id), int(team_id), metric_set, source_hash])
+    return hashlib.sha256(identity.encode("utf-8")).hexdigest()
+
+
+class MetricsCache:
+    # Per-(match, team) metric rows stored by content address in a small SQLite file,
+    # with a size limit and least recently used eviction
+
+    def __init__(self, path=METRICS_CACHE_PATH, max_bytes=METRICS_CACHE_MAX_BYTES):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.max_bytes = max_bytes
+        self.connection = sqlite3.connect(path, timeout=METRICS_CACHE_TIMEOUT)
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS metrics_cache (
+                key         TEXT PRIMARY KEY,
+                payload     TEXT NOT NULL,
+                size        INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS metrics_cache_last_access ON metrics_cache (last_access)"
+        )
+        self.connection.commit()
+
+    def get_many(self, keys):
+        # key -> (rows, fingerprint) for the keys found in the cache
+        keys = [key for key in keys if key is not None]
+        found = {}
+
+        with self.connection:
+            for key in keys:
+                row = self.connection.execute(
+                    "SELECT payload FROM metrics_cache WHERE key = ?", (key,)
+                ).fetchone()
+
+                if row is not None:
+                    payload = json.loads(row[0])
+                    found[key] = ([tuple(player_row) for player_row in payload["rows"]], payload["fingerprint"])
+
+            # mark the hits as recently used
+            now = time.time()
+            self.connection.executemany(
+                "UPDATE metrics_cache SET last_access = ? WHERE key = ?",
+                [(now, key) for key in found]
+            )
+
+        return found
+
+    def get(self, key):
+        # (rows, fingerprint) or None
+        return self.get_many([key]).get(key)
+
+    def put_many(self, entries):
+        # entries: (key, rows, fingerprint)
+        now = time.time()
+        records = []
+        for key, rows, fingerprint in entries:
+            payload = json.dumps({
+                "rows": [
+                    [int(player_id), *map(float, scores)]
+                    for player_id, *scores in rows
+                ],
+                "fingerprint": fingerprint
+            })
+            records.append((key, payload, len(payload), now))
+
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO metrics_cache (key, payload, size, last_access) VALUES (?, ?, ?, ?)",
+                records
+            )
+            self._evict()
+
+    def put(self, key, rows, fingerprint=None):
+        self.put_many([(key, rows, fingerprint)])
+
+    def _evict(self):
+        # Drop the least recently used entries until the cache fits in max_bytes
+        total = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM metrics_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        evicted = []
+        for key, size in self.connection.execute("SELECT key, size FROM metrics_cache ORDER BY last_access"):
+            if total <= self.max_bytes:
+                break
+            evicted.append((key,))
+            total -= size
+
+        self.connection.executemany("DELETE FROM metrics_cache WHERE key = ?", evicted)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
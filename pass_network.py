@@ -0,0 +1,174 @@
+import numpy as np
+import pandas as pd
+import networkx as nx
+
+
+# Keys identifying one team-graph inside a competition
+GRAPH_KEYS = ["matchId", "teamId"]
+
+
+def pair_passes(passes, group_keys=(), pass_columns=(), chain_column=None):
+    # Pair every pass with the next pass of the same group (passer -> receiver)
+    # in one shifted-array operation, keeping the original pass order.
+    # pass_columns are carried over from the first pass of every pair.
+    # With a chain_column (see possession.py) only passes of the same chain are paired
+    group_keys = list(group_keys)
+
+    if group_keys:
+        # stable sort so that each group is contiguous but keeps its pass order
+        codes = passes.groupby(group_keys, sort=False).ngroup().to_numpy()
+        order = np.argsort(codes, kind="stable")
+        codes = codes[order]
+        same_group = codes[1:] == codes[:-1]
+    else:
+        order = np.arange(len(passes))
+        same_group = np.ones(max(len(passes) - 1, 0), dtype=bool)
+
+    if chain_column is not None:
+        chains = passes[chain_column].to_numpy()[order]
+        same_group = same_group & (chains[1:] == chains[:-1])
+
+    player_ids = passes["playerId"].to_numpy()[order]
+
+    pairs = {
+        key: passes[key].to_numpy()[order][:-1][same_group]
+        for key in group_keys + list(pass_columns)
+    }
+    pairs["passer"] = player_ids[:-1][same_group]
+    pairs["receiver"] = player_ids[1:][same_group]
+
+    return pd.DataFrame(pairs)
+
+
+def pass_edge_list(passes, group_keys=(), completed_column=None, chain_column=None):
+    # Weighted edge list [*group_keys, passer, receiver, weight],
+    # edges appear in the order they are first seen in the passes.
+    # completed_column (boolean, e.g. the accurate pass tag) adds the "completed" count
+    # of the pairs whose pass has it, chain_column restricts the pairs to possession chains
+    group_keys = list(group_keys)
+    pass_columns = [] if completed_column is None else [completed_column]
+    pairs = pair_passes(passes, group_keys, pass_columns, chain_column)
+
+    grouped = pairs.groupby(group_keys + ["passer", "receiver"], sort=False)
+    edges = grouped.size().reset_index(name="weight")
+
+    if completed_column is not None:
+        edges["completed"] = grouped[completed_column].sum().to_numpy()
+
+    return edges
+
+
+class PassNetwork:
+    # Compact passing network of one team in one match.
+    # players[i] is the playerId of node i (nodes in order of first appearance, like the nx graphs)
+    # weights[i, j] is the number of passes from players[i] to players[j]
+    __slots__ = ("players", "weights")
+
+    def __init__(self, players, weights):
+        self.players = players
+        self.weights = weights
+
+    @classmethod
+    def from_edges(cls, passers, receivers, counts):
+        # Network from parallel passer / receiver / weight arrays
+        players = pd.unique(np.column_stack([passers, receivers]).ravel())
+        index = pd.Index(players)
+
+        weights = np.zeros((len(players), len(players)), dtype=np.uint16)
+        weights[index.get_indexer(passers), index.get_indexer(receivers)] = counts
+
+        return cls(players, weights)
+
+    @classmethod
+    def from_networkx(cls, G, weight="weight"):
+        players = np.array(list(G), dtype=np.int64)
+        position = {node: i for i, node in enumerate(G)}
+
+        weights = np.zeros((len(players), len(players)), dtype=np.uint16)
+        for u, v, w in G.edges(data=weight, default=1):
+            weights[position[u], position[v]] = w
+
+        return cls(players, weights)
+
+    def __len__(self):
+        return len(self.players)
+
+    def number_of_edges(self):
+        return int(np.count_nonzero(self.weights))
+
+    def nodes(self):
+        return self.players.tolist()
+
+    def density(self):
+        # Same as nx.density on the directed graph (self loops count as edges)
+        n = len(self.players)
+        if n < 2:
+            return 0.0
+        return self.number_of_edges() / (n * (n - 1))
+
+    def degree(self):
+        # Weighted degree (passes made + received) of every node, like G.degree(weight="weight")
+        return self.weights.sum(axis=0, dtype=np.int64) + self.weights.sum(axis=1, dtype=np.int64)
+
+    def to_networkx(self):
+        # Equivalent nx.DiGraph, when an algorithm is only available in networkx
+        G = nx.DiGraph()
+        G.add_nodes_from(self.players.tolist())
+
+        rows, cols = np.nonzero(self.weights)
+        G.add_weighted_edges_from(zip(
+            self.players[rows].tolist(),
+            self.players[cols].tolist(),
+            self.weights[rows, cols].tolist()
+        ))
+        return G
+
+
+def as_pass_network(G):
+    # Accept both networkx graphs and PassNetwork in the metric functions
+    return G if isinstance(G, PassNetwork) else PassNetwork.from_networkx(G)
+
+
+def sliding_pass_networks(passes, window, step, clock_column="matchSec", chain_column=None):
+    # Passing networks of one team in one match over a trailing time window, updated incrementally.
+    # Windows end at step, 2 * step, ... seconds since kick-off and cover [end - window, end):
+    # at every step the pass pairs entering the window are added to the edge counts and the ones
+    # leaving it are removed, the counts are never rebuilt. A pair (passer -> next passer, as in
+    # pair_passes, inside a chain with a chain_column) is dated at its first pass.
+    # Yields (start, end, network); the network holds the players with a pass in the window,
+    # in order of first appearance in the match
+    player_ids = passes["playerId"].to_numpy()
+    players = pd.unique(player_ids)
+    codes = pd.Index(players).get_indexer(player_ids)
+
+    linked = np.ones(max(len(passes) - 1, 0), dtype=bool)
+    if chain_column is not None:
+        chains = passes[chain_column].to_numpy()
+        linked = chains[1:] == chains[:-1]
+
+    pair_times = passes[clock_column].to_numpy()[:-1][linked]
+    order = np.argsort(pair_times, kind="stable")
+    times = pair_times[order]
+    passers = codes[:-1][linked][order]
+    receivers = codes[1:][linked][order]
+
+    weights = np.zeros((len(players), len(players)), dtype=np.int64)
+    added = removed = 0
+    last = times[-1] if len(times) else 0.0
+    end = step
+
+    while True:
+        start = max(0.0, end - window)
+        entered = int(np.searchsorted(times, end, side="left"))
+        left = int(np.searchsorted(times, start, side="left"))
+
+        np.add.at(weights, (passers[added:entered], receivers[added:entered]), 1)
+        np.subtract.at(weights, (passers[removed:left], receivers[removed:left]), 1)
+        added, removed = entered, left
+
+        active = (weights.sum(axis=0) + weights.sum(axis=1)) > 0
+        yield start, end, PassNetwork(players[active], weights[np.ix_(active, active)].astype(np.uint16))
+
+        if end > last:
+            break
+        end += step
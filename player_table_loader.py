@@ -1,218 +1,260 @@
 import json
+import os
+import sys
+import numpy as np
+import pandas as pd
 
 # sql lite
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from Models.Base import Base
-from Models.Player import Player
+from data_paths import PLAYERS_PATH, events_path, matches_path
+from database import GraphStatisticWriter
+from event_cache import open_event_cache
+from event_statistics import EVENT_STATISTICS
+from event_stream import RAW_DATA_PATH, iter_competition_events, iter_raw_json
 
 
-# SELECT COMPETITION TO LOAD PLAYERS FOR
+# SELECT COMPETITION TO LOAD PLAYERS FOR (when run as a script)
 
 COMPETITION = "England"
 
-DATABASE_URL = f"sqlite:///Databases/Data_{COMPETITION}.db"
+# True: stream players, matches and events straight from the RawData/*.zip archives
+# (bounded memory, no extraction needed). False: read the extracted files in Data/
+STREAM_EVENTS = False
 
 
-# DB session
-engine = create_engine(DATABASE_URL, echo=False)
-SessionLocal = sessionmaker(bind=engine)
-session = SessionLocal()
-
-Base.metadata.create_all(engine)
+# helper to log winner
+def match_result(team_score, opponent_score):
+    if team_score > opponent_score:
+        return "win"
+    elif team_score < opponent_score:
+        return "loss"
+    else:
+        return "draw"
 
 
 # players metadata
+def load_players(stream_events=STREAM_EVENTS):
+    print("Loading players.json...")
 
-print("Loading players.json...")
+    if stream_events:
+        return list(iter_raw_json("players.json"))
 
-BASE_PATH = "Data"
+    with open(PLAYERS_PATH) as f:
+        return json.load(f)
 
-with open(f"{BASE_PATH}/players.json") as f:
-    players = json.load(f)
-    
-# dictionary for statistics
-player_stats = {}
 
-print("Initialized empty player table for competition:", COMPETITION)
+# match files: add new players to the table and record wins/losses
+def add_match_stats(player_stats, competition, players_by_id, stream_events=STREAM_EVENTS):
+    print("Processing matches files...")
 
+    match_files = [matches_path(competition)]
 
-# match files
+    for file_path in match_files:
+        print(f"  Reading {file_path}")
 
-print("Processing matches files...")
+        if stream_events:
+            matches = list(iter_raw_json(os.path.basename(file_path)))
+        else:
+            with open(file_path, "r", encoding="utf-8") as f:
 
-# helper to log winner
-def match_result(team_score, opponent_score):
-    if team_score > opponent_score:
-        return "win"
-    elif team_score < opponent_score:
-        return "loss"
-    else:
-        return "draw"
+                matches = json.load(f)
+
+        for match in matches:
+            teams_data = match["teamsData"]
 
-# Lookup dictionary
-PLAYERS_BY_ID = {p["wyId"]: p for p in players}
+            # read the two teams playing this match
+            team_ids = list(teams_data.keys())
+            team_a = team_ids[0]
+            team_b = team_ids[1]
 
+            score_a = teams_data[team_a]["score"]
+            score_b = teams_data[team_b]["score"]
 
-match_files = [f"Data/matches/matches_{COMPETITION}.json"]
+            # twice to update both teams results
+            result_a = match_result(score_a, score_b)
+            result_b = match_result(score_b, score_a)
 
-# add new players to the table and record wins/losses
-for file_path in match_files:
-    print(f"  Reading {file_path}")
+            for team_id, result in [(team_a, result_a), (team_b, result_b)]:
+                formation = teams_data[team_id]["formation"]
 
-    with open(file_path, "r", encoding="utf-8") as f:
+                # loop through formation and bench
+                players_in_match = formation["lineup"] + formation["bench"]
 
-        matches = json.load(f)
+                for player in players_in_match:
+                    pid = player["playerId"]
 
-    for match in matches:
-        teams_data = match["teamsData"]
+                    if pid not in player_stats:
+                        # first time we see this player in this competition
+                        p = players_by_id.get(pid)
+                        if p is None:
+                            continue
 
-        # read the two teams playing this match
-        team_ids = list(teams_data.keys())
-        team_a = team_ids[0]
-        team_b = team_ids[1]
+                        team_id = p["currentTeamId"]
 
-        score_a = teams_data[team_a]["score"]
-        score_b = teams_data[team_b]["score"]
+                        player_stats[pid] = {
+                            "playerId": pid,
+                            "firstName": p["firstName"],
+                            "lastName": p["lastName"],
+                            "role": p["role"]["code2"],
+                            "birthDate": p["birthDate"],
+                            "currentTeamId": team_id,
 
-        # twice to update both teams results
-        result_a = match_result(score_a, score_b)
-        result_b = match_result(score_b, score_a)
+                            "total_matches": 0,
+                            "wins": 0,
+                            "draws": 0,
+                            "losses": 0,
 
-        for team_id, result in [(team_a, result_a), (team_b, result_b)]:
-            formation = teams_data[team_id]["formation"]
+                            # counted from the events (see event_statistics.py)
+                            **dict.fromkeys(EVENT_STATISTICS, 0)
+                        }
 
-            # loop through formation and bench
-            players_in_match = formation["lineup"] + formation["bench"]
+                    player_stats[pid]["total_matches"] += 1
 
-            for player in players_in_match:
-                pid = player["playerId"]
+                    if result == "win":
+                        player_stats[pid]["wins"] += 1
+                    elif result == "loss":
+                        player_stats[pid]["losses"] += 1
+                    else:
+                        player_stats[pid]["draws"] += 1
 
-                if pid not in player_stats:
-                    # first time we see this player in this competition
-                    p = PLAYERS_BY_ID.get(pid)
-                    if p is None:
-                        continue
 
-                    team_id = p["currentTeamId"]
 
-                    player_stats[pid] = {
-                        "playerId": pid,
-                        "firstName": p["firstName"],
-                        "lastName": p["lastName"],
-                        "role": p["role"]["code2"],
-                        "birthDate": p["birthDate"],
-                        "currentTeamId": team_id,
+# used for sub event types (shot->goal? pass->completed?) of a single event
+def add_event_stats(stats, event_name, tags):
+    # event = single action in some match
+    # same event can have multiple tag properties
+    for statistic, (statistic_event, statistic_tags) in EVENT_STATISTICS.items():
+        if statistic_event is not None and event_name != statistic_event:
+            continue
+        if statistic_tags is not None and not any(tag in tags for tag in statistic_tags):
+            continue
+
+        stats[statistic] += 1
 
-                        "total_matches": 0,
-                        "wins": 0,
-                        "draws": 0,
-                        "losses": 0,
 
-                        "total_passes": 0,
-                        "completed_passes": 0,
-                        "goals": 0,
-                        "assists": 0,
-                        "fouls_committed": 0,
-                        "yellow_cards": 0,
-                        "red_cards": 0
-                    }
+def event_statistic_counts(cache, player_ids):
+    # EVENT_STATISTICS of the whole events cache as grouped sums:
+    # statistic -> count per player, aligned with player_ids.
+    # The tags are decoded once into a boolean matrix, every statistic is a column selection + bincount
+    tags = sorted({tag for event_name, statistic_tags in EVENT_STATISTICS.values() for tag in statistic_tags or ()})
+    tag_matrix = cache.tag_matrix(tags)
 
-                player_stats[pid]["total_matches"] += 1
+    # position of the player of every event in player_ids (-1 = bad id)
+    players = pd.Index(player_ids).get_indexer(np.asarray(cache.column("playerId")))
+    known = players >= 0
 
-                if result == "win":
-                    player_stats[pid]["wins"] += 1
-                elif result == "loss":
-                    player_stats[pid]["losses"] += 1
-                else:
-                    player_stats[pid]["draws"] += 1
+    counts = {}
+    for statistic, (event_name, statistic_tags) in EVENT_STATISTICS.items():
+        selected = known.copy()
 
+        if event_name is not None:
+            selected &= cache.mask("eventName", event_name)
+        if statistic_tags is not None:
+            selected &= tag_matrix[:, [tags.index(tag) for tag in statistic_tags]].any(axis=1)
+
+        counts[statistic] = np.bincount(players[selected], minlength=len(player_ids))
+
+    return counts
 
 
-# WYSCOUT TAG-ID LIST:  https://dataglossary.wyscout.com/
-# used for sub event types (shot->goal? pass->completed?)
 # event files
-print("Processing events files...")
+def add_competition_event_stats(player_stats, competition, stream_events=STREAM_EVENTS):
+    print("Processing events files...")
 
-event_files = [f"Data/events/events_{COMPETITION}.json"]
+    event_files = [events_path(competition)]
 
-for file_path in event_files:
-    print(f"  Reading {file_path}")
+    if stream_events:
+        print(f"  Streaming events_{competition}.json from {RAW_DATA_PATH}")
 
-    with open(file_path, "r", encoding="utf-8") as f:
-        events = json.load(f)
+        # generator pipeline: one event dict at a time, never the whole file
+        for event in iter_competition_events(competition):
+            player_id = event.get("playerId")
 
-    # no need to consider match id, we only care for global player stats
-    for event in events:
-        # event = single action in some match
-        player_id = event.get("playerId")
+            if player_id not in player_stats:
+                # bad id
+                continue
+
+            tags = {tag["id"] for tag in event.get("tags", [])}
+            add_event_stats(player_stats[player_id], event.get("eventName", ""), tags)
+
+        return
+
+    player_ids = list(player_stats)
+
+    for file_path in event_files:
+        print(f"  Reading {file_path}")
+
+        # columnar cache of the events file, built the first time it is needed
+        cache = open_event_cache(file_path)
+
+        # no need to consider match id, we only care for global player stats
+        for statistic, player_counts in event_statistic_counts(cache, player_ids).items():
+            for player_id, count in zip(player_ids, player_counts.tolist()):
+                player_stats[player_id][statistic] += count
+
+
+# Columns of the players table, in the order of the stats dictionaries
+PLAYER_COLUMNS = [
+    "playerId", "firstName", "lastName", "role", "birthDate", "currentTeamId",
+    "total_matches", "wins", "draws", "losses"
+] + list(EVENT_STATISTICS)
 
-        if player_id not in player_stats:
-            # bad id
-            continue
-        
-        # read if it was pass shot foul etc
-        event_name = event.get("eventName", "")
-        # faster event type check
-        # same event can have multiple tag properties
-        tags = {tag["id"] for tag in event.get("tags", [])}
-
-        # passes (any kind)
-        if event_name == "Pass":
-            player_stats[player_id]["total_passes"] += 1
-
-            if 1801 in tags:   
-                # accurate pass
-                player_stats[player_id]["completed_passes"] += 1
-
-            if 301 in tags:
-                # pass is also an assist
-                player_stats[player_id]["assists"] += 1
-
-        # goals
-        elif event_name == "Shot":
-            if 101 in tags:    
-                # shot was also a goal
-                player_stats[player_id]["goals"] += 1
-
-        # fouls
-        elif event_name == "Foul":
-            player_stats[player_id]["fouls_committed"] += 1
-
-        # cards
-        if 1702 in tags:      
-            # yellow card
-            player_stats[player_id]["yellow_cards"] += 1
-
-        if 1701 in tags or 1703 in tags:      
-            # red card
-            player_stats[player_id]["red_cards"] += 1
 
 # DB EXPORT
-for pid, stats in player_stats.items():
-    player = Player(
-        playerId=stats["playerId"],
-        firstName=stats["firstName"],
-        lastName=stats["lastName"],
-        role=stats["role"],
-        birthDate=stats["birthDate"],
-        currentTeamId=stats["currentTeamId"],
-
-        total_matches=stats["total_matches"],
-        wins=stats["wins"],
-        draws=stats["draws"],
-        losses=stats["losses"],
-
-        total_passes=stats["total_passes"],
-        completed_passes=stats["completed_passes"],
-        goals=stats["goals"],
-        assists=stats["assists"],
-        fouls_committed=stats["fouls_committed"],
-        yellow_cards=stats["yellow_cards"],
-        red_cards=stats["red_cards"],
-    )
-
-    # avoids duplicate keys
-    session.merge(player)
-
-session.commit()
+def save_player_table(competition, player_stats, writer=None):
+    # All the players of a competition in one bulk upsert, one transaction for the database
+    # (same result as a session.merge per player: existing rows are replaced, the others kept).
+    # writer: GraphStatisticWriter or ingestion writer of the competition database to send the
+    # rows to (e.g. the one of a run writing the metrics at the same time), None to open one
+    rows = [{column: stats[column] for column in PLAYER_COLUMNS} for stats in player_stats.values()]
+
+    if writer is not None:
+        writer.save_players(rows)
+        return
+
+    # players only: node_data stays to the graph writers (a season may be running on the database)
+    with GraphStatisticWriter(f"sqlite:///Databases/Data_{competition}.db", derive_node_data=False) as writer:
+        writer.save_players(rows)
+
+
+# Statistics of every player of one competition: one scan of its matches and of its events
+def competition_player_stats(competition, players_by_id, stream_events=STREAM_EVENTS):
+    # dictionary for statistics
+    player_stats = {}
+
+    print("Initialized empty player table for competition:", competition)
+
+    add_match_stats(player_stats, competition, players_by_id, stream_events)
+    add_competition_event_stats(player_stats, competition, stream_events)
+
+    return player_stats
+
+
+# Build and store the players tables of many competitions in one run:
+# players.json is parsed once and its index shared by all of them.
+# writers: optional competition -> writer of its database (see save_player_table).
+# Returns competition -> number of players
+def load_player_tables(competitions, stream_events=STREAM_EVENTS, writers=None):
+    players = load_players(stream_events)
+
+    # Lookup dictionary
+    players_by_id = {p["wyId"]: p for p in players}
+    del players
+
+    loaded = {}
+    for competition in competitions:
+        player_stats = competition_player_stats(competition, players_by_id, stream_events)
+        save_player_table(competition, player_stats, (writers or {}).get(competition))
+        loaded[competition] = len(player_stats)
+
+    return loaded
+
+
+# Build and store the players table of one competition, returns the number of players
+def load_player_table(competition, stream_events=STREAM_EVENTS, writer=None):
+    writers = None if writer is None else {competition: writer}
+    return load_player_tables([competition], stream_events, writers)[competition]
+
+
+if __name__ == "__main__":
+    # python player_table_loader.py Italy England ...   (default: COMPETITION)
+    load_player_tables(sys.argv[1:] or [COMPETITION])
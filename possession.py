@@ -0,0 +1,121 @@
+import os
+import numpy as np
+
+
+# Possession chains: every event gets the id of the chain it belongs to, a run of consecutive
+# events of the same team in the same period without a stop in play. The pass networks link
+# two passes only inside a chain, a pass is never paired with the next pass of its team after
+# the ball was lost, out of play or restarted from a set piece.
+#
+# A new chain starts at:
+#   - the first event of every match and period (matchPeriod changes)
+#   - a change of the team in possession; contested events (duels, recorded for both players)
+#     do not change it
+#   - the event after an interruption (ball out, whistle), a foul, an offside or an inaccurate
+#     pass (Pass without the accurate tag 1801)
+#   - a set piece restart (free kick, corner, throw in, goal kick)
+#
+# The ids are computed for a whole competition at once with shifted-array comparisons
+# and one cumulative sum, they increase along the events. event_chains saves them next to the
+# columns of the event cache, the graph store and the match timelines read the same ids;
+# stream_chains computes them on the event dicts of a stream (see GraphStore.from_stream).
+
+# Pass networks built from chains (False: every pass is paired with the next pass of its team)
+POSSESSION_CHAINS = True
+
+# Column holding the chain id of the passes (event store, graph store)
+CHAIN_COLUMN = "chainId"
+
+ACCURATE_PASS_TAG = 1801
+
+# Bump when the chain rules change, saved chain ids are then recomputed
+CHAINS_VERSION = 1
+
+# Chain ids file inside the event cache (dropped with the cache when the events json changes)
+CHAINS_FILE = f"{CHAIN_COLUMN}_v{CHAINS_VERSION}.npy"
+
+# Play stops after these events
+INTERRUPTION_EVENTS = ["Interruption", "Foul", "Offside"]
+
+# Set pieces, they start a new chain
+RESTART_EVENTS = ["Free Kick"]
+
+# Recorded for both teams, they do not change the team in possession
+CONTESTED_EVENTS = ["Duel"]
+
+
+def events_named(cache, names):
+    # Boolean mask of the events whose eventName is one of names
+    codes = [cache.code("eventName", name) for name in names]
+    return np.isin(np.asarray(cache.columns["eventName"]), codes)
+
+
+def possession_chains(cache):
+    # Chain id of every event of an EventCache, in the order of the events
+    inaccurate_pass = events_named(cache, ["Pass"]) & ~cache.tag_matrix([ACCURATE_PASS_TAG])[:, 0]
+
+    return chain_ids(
+        np.asarray(cache.columns["matchId"]),
+        np.asarray(cache.columns["matchPeriod"]),
+        np.asarray(cache.columns["teamId"]),
+        contested=events_named(cache, CONTESTED_EVENTS),
+        stop=events_named(cache, INTERRUPTION_EVENTS) | inaccurate_pass,
+        restart=events_named(cache, RESTART_EVENTS)
+    )
+
+
+def stream_chains(events):
+    # Chain id of every event of a list of raw event dicts (e.g. one match read from a stream)
+    names = np.array([event["eventName"] for event in events], dtype=object)
+    accurate = np.array([any(tag["id"] == ACCURATE_PASS_TAG for tag in event["tags"]) for event in events], dtype=bool)
+
+    return chain_ids(
+        np.array([event["matchId"] for event in events]),
+        np.array([event["matchPeriod"] for event in events], dtype=object),
+        np.array([event["teamId"] for event in events]),
+        contested=np.isin(names, CONTESTED_EVENTS),
+        stop=np.isin(names, INTERRUPTION_EVENTS) | ((names == "Pass") & ~accurate),
+        restart=np.isin(names, RESTART_EVENTS)
+    )
+
+
+def chain_ids(match_ids, periods, team_ids, contested, stop, restart):
+    # Chain ids from the event columns and the masks of the contested events,
+    # the events after which play stops and the restarts
+    n_events = len(match_ids)
+    if n_events == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    positions = np.arange(n_events)
+
+    new_period = np.r_[True, (match_ids[1:] != match_ids[:-1]) | (periods[1:] != periods[:-1])]
+
+    # team in possession: team of the last uncontested event of the same period
+    period_start = np.maximum.accumulate(np.where(new_period, positions, 0))
+    last_uncontested = np.maximum.accumulate(np.where(contested, -1, positions))
+    possession = np.where(
+        last_uncontested >= period_start,
+        team_ids[np.maximum(last_uncontested, 0)],
+        team_ids
+    )
+
+    new_chain = (
+        new_period
+        | np.r_[False, possession[1:] != possession[:-1]]
+        | np.r_[False, stop[:-1]]
+        | restart
+    )
+
+    return np.cumsum(new_chain, dtype=np.int64) - 1
+
+
+def event_chains(cache, mmap_mode="r"):
+    # possession_chains of an EventCache, computed the first time and memory-mapped afterwards
+    path = os.path.join(cache.directory, CHAINS_FILE)
+
+    if not os.path.exists(path):
+        tmp_path = path + ".tmp.npy"
+        np.save(tmp_path, possession_chains(cache))
+        os.replace(tmp_path, path)
+
+    return np.load(path, mmap_mode=mmap_mode)
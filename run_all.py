@@ -0,0 +1,381 @@
+import argparse
+import json
+import os
+import queue
+import sys
+import time
+from datetime import datetime
+from multiprocessing import Process, Queue
+
+import instrumentation
+from data_paths import events_path, matches_path
+from event_cache import cache_is_fresh
+
+
+# Non-interactive pipeline: graph metrics, player table and analysis for any set of competitions.
+# Competitions run in parallel (one process each) within a worker and a memory budget,
+# the wall time of every stage is written to a run summary.
+#
+#   python run_all.py                                  all competitions, all stages
+#   python run_all.py Italy England --workers 2        two competitions at a time
+#   python run_all.py --stages metrics --memory-budget 8
+
+COMPETITIONS = [
+    "Italy",
+    "England",
+    "Spain",
+    "France",
+    "Germany",
+    "World_Cup",
+    "European_Championship"
+]
+
+# Stages run in this order for every competition (analysis needs the first two,
+# graphs only the events: the graph-level summary of analysis_graph_level.py)
+STAGES = ["metrics", "players", "analysis", "graphs"]
+
+SUMMARY_PATH = "Results/run_summary.json"
+LOG_DIRECTORY_PATH = "Results/logs"
+INSTRUMENTATION_PATH = "Results/instrumentation_{competition}.jsonl"
+
+# Cups have few games per player: lower threshold for the analysis
+MIN_GAMES = {
+    "World_Cup": 5,
+    "European_Championship": 5
+}
+
+# Peak memory of a competition as a multiple of its events json size:
+# building the columnar cache (streamed, in batches) dominates, a fresh cache is memory mapped
+MEMORY_PER_EVENT_BYTE = 3
+MEMORY_PER_CACHED_EVENT_BYTE = 2
+
+# Fraction of the physical memory used when no budget is given
+DEFAULT_MEMORY_FRACTION = 0.75
+
+# Seconds between two checks of the running competitions
+POLL_INTERVAL = 0.5
+
+
+def estimate_memory(competition):
+    # Rough peak memory (bytes) of one competition run, from the size of its events file
+    path = events_path(competition)
+    if not os.path.exists(path):
+        return 0
+
+    factor = MEMORY_PER_CACHED_EVENT_BYTE if cache_is_fresh(path) else MEMORY_PER_EVENT_BYTE
+    return os.path.getsize(path) * factor
+
+
+def physical_memory():
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+# ================================== STAGES =============================================
+
+def database_url(competition):
+    return f"sqlite:///Databases/Data_{competition}.db"
+
+
+def run_metrics(competition, season_workers, writer):
+    # Graph metrics of the whole season, matches already stored or cached are skipped
+    from graph_store import GraphStore
+    from metrics_cache import MetricsCache
+    from season import compute_season
+
+    with open(matches_path(competition), "r", encoding="utf-8") as f:
+        matches = json.load(f)
+
+    graph_store = GraphStore.from_json(events_path(competition))
+
+    with MetricsCache() as metrics_cache:
+        computed = compute_season(
+            graph_store, matches, writer, workers=season_workers,
+            metrics_cache=metrics_cache, competition=competition
+        )
+
+    return {"matches": len(matches), "computed": computed}
+
+
+def run_players(competition, season_workers, writer):
+    from player_table_loader import load_player_table
+
+    return {"players": load_player_table(competition, writer=writer)}
+
+
+def run_analysis(competition, season_workers, writer):
+    from analysis_main import run_analysis as analyse
+
+    return {"results": analyse(competition, min_games=MIN_GAMES.get(competition, 10))}
+
+
+def run_graphs(competition, season_workers, writer):
+    # Graph-level summary (density, clustering) of the competition, in its own file
+    # so that parallel competitions do not write to the same one
+    from analysis_graph_level import RESULTS_PATH, competition_graph_metrics, write_graph_summary
+
+    summary = competition_graph_metrics(competition)
+
+    os.makedirs(RESULTS_PATH, exist_ok=True)
+    output_path = f"{RESULTS_PATH}/graph_level_{competition}.txt"
+    with open(output_path, "w", encoding="utf-8") as out:
+        write_graph_summary(out, competition, summary)
+
+    return {"graph_level": output_path, **summary}
+
+
+STAGE_FUNCTIONS = {
+    "metrics": run_metrics,
+    "players": run_players,
+    "analysis": run_analysis,
+    "graphs": run_graphs
+}
+
+# Stages writing the competition database, through the single writer of the competition
+WRITING_STAGES = ["metrics", "players"]
+
+
+def run_competition(competition, stages, season_workers, results, instrument=False, profile_match_id=None):
+    # Body of a competition process: run the stages, send the summary back to the scheduler.
+    # The output of the stages goes to a log file, so parallel competitions do not interleave
+    # the command line options add to the environment ones (see instrumentation.py)
+    instrumentation.configure(
+        enabled=instrument or instrumentation.enabled(),
+        path=INSTRUMENTATION_PATH.format(competition=competition),
+        profile_match_id=profile_match_id if profile_match_id is not None else instrumentation.profile_match_id()
+    )
+
+    os.makedirs(LOG_DIRECTORY_PATH, exist_ok=True)
+    log_path = os.path.join(LOG_DIRECTORY_PATH, f"run_{competition}.log")
+
+    summary = {"competition": competition, "status": "ok", "log": log_path, "stages": {}, "results": {}}
+    start = time.perf_counter()
+
+    with open(log_path, "w", encoding="utf-8") as log:
+        sys.stdout = log
+        sys.stderr = log
+
+        # every write of the stages (metrics and players) goes through one writer process:
+        # the analysis stage reads the database only after it is closed
+        writer = None
+
+        for stage in stages:
+            stage_start = time.perf_counter()
+            print(f"=== {stage} ({competition}) ===", flush=True)
+
+            try:
+                if stage in WRITING_STAGES and writer is None:
+                    from ingestion import Ingestion
+                    # node_data is derived by the runs computing the graphs, not by a players only run
+                    writer = Ingestion(database_url(competition), derive_node_data="metrics" in stages)
+                elif stage not in WRITING_STAGES and writer is not None:
+                    writer.close()
+                    writer = None
+
+                summary["results"][stage] = STAGE_FUNCTIONS[stage](competition, season_workers, writer)
+            except Exception as e:
+                # a failed stage stops the competition, the other competitions go on
+                print(f"Unexpected error: {e}")
+                summary["status"] = "failed"
+                summary["error"] = f"{stage}: {e}"
+                break
+            finally:
+                summary["stages"][stage] = round(time.perf_counter() - stage_start, 3)
+                log.flush()
+
+        if writer is not None:
+            try:
+                writer.close()
+            except Exception as e:
+                print(f"Unexpected error: {e}")
+                summary["status"] = "failed"
+                summary["error"] = f"write: {e}"
+
+    summary["wall_time"] = round(time.perf_counter() - start, 3)
+    results.put(summary)
+
+
+# ================================== SCHEDULER =============================================
+
+def collect(results, summaries):
+    # Move the summaries sent by the finished competitions into summaries
+    try:
+        while True:
+            summary = results.get(timeout=POLL_INTERVAL)
+            summaries[summary["competition"]] = summary
+    except queue.Empty:
+        pass
+
+
+def run_all(competitions, stages=STAGES, workers=1, memory_budget=None, season_workers=1,
+            instrument=False, profile_match_id=None):
+    # Run the competitions with at most `workers` of them at a time and the sum of their
+    # estimated memory within memory_budget (bytes, None = no limit). The largest competitions
+    # start first; a competition larger than the whole budget still runs, alone.
+    # Returns the summary of every competition, in the given order
+    estimates = {competition: estimate_memory(competition) for competition in competitions}
+    pending = sorted(competitions, key=lambda competition: -estimates[competition])
+    running = {}
+    summaries = {}
+    results = Queue()
+
+    while pending or running:
+        for competition in list(pending):
+            if len(running) >= workers:
+                break
+
+            used = sum(memory for process, memory in running.values())
+            if running and memory_budget is not None and used + estimates[competition] > memory_budget:
+                continue
+
+            process = Process(
+                target=run_competition,
+                args=(competition, stages, season_workers, results, instrument, profile_match_id),
+                name=f"run_{competition}"
+            )
+            process.start()
+            running[competition] = (process, estimates[competition])
+            pending.remove(competition)
+            print(f"Started {competition} (~{estimates[competition] / 2**20:.0f} MB)")
+
+        collect(results, summaries)
+
+        for competition, (process, memory) in list(running.items()):
+            if process.is_alive():
+                continue
+
+            process.join()
+            collect(results, summaries)
+            del running[competition]
+
+            if competition not in summaries:
+                # killed before it could report (e.g. out of memory)
+                summaries[competition] = {
+                    "competition": competition,
+                    "status": "failed",
+                    "error": f"process exited with code {process.exitcode}",
+                    "stages": {},
+                    "results": {}
+                }
+
+            summary = summaries[competition]
+            print(f"Finished {competition}: {summary['status']} in {sum(summary['stages'].values()):.1f}s")
+
+    return [summaries[competition] for competition in competitions]
+
+
+def write_summary(summary, path=SUMMARY_PATH):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+
+
+def print_summary(summary):
+    stages = summary["stages"]
+    print(f"\n{'competition':<24}{'status':<8}" + "".join(f"{stage:>10}" for stage in stages) + f"{'total':>10}")
+
+    for competition in summary["competitions"]:
+        times = "".join(
+            f"{competition['stages'][stage]:>10.1f}" if stage in competition["stages"] else f"{'-':>10}"
+            for stage in stages
+        )
+        print(f"{competition['competition']:<24}{competition['status']:<8}{times}{sum(competition['stages'].values()):>10.1f}")
+
+    print(f"\nWall time: {summary['wall_time']:.1f}s")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run graph metrics, player tables and analysis without prompts.")
+    parser.add_argument(
+        "competitions", nargs="*", default=COMPETITIONS, metavar="COMPETITION",
+        help=f"competitions to run (default: all of {', '.join(COMPETITIONS)})"
+    )
+    parser.add_argument(
+        "--stages", nargs="+", choices=STAGES, default=STAGES,
+        help="stages to run for every competition (default: all)"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=os.cpu_count() or 1,
+        help="competitions run at the same time (default: number of cpus)"
+    )
+    parser.add_argument(
+        "--season-workers", type=int, default=1,
+        help="processes computing the matches of one competition (default: 1)"
+    )
+    parser.add_argument(
+        "--memory-budget", type=float, default=None,
+        help=f"GB available to the running competitions (default: {DEFAULT_MEMORY_FRACTION:.0%}% of the physical memory)"
+    )
+    parser.add_argument(
+        "--instrument", action="store_true",
+        help="record stage timings and counters in Results/instrumentation_{competition}.jsonl"
+    )
+    parser.add_argument(
+        "--profile-match", type=int, default=None, metavar="MATCH_ID",
+        help="compute this match again under cProfile (stats in Results/profile_{match_id}.prof)"
+    )
+    parser.add_argument(
+        "--summary", default=SUMMARY_PATH,
+        help=f"run summary json (default: {SUMMARY_PATH})"
+    )
+    args = parser.parse_args(argv)
+
+    unknown = [competition for competition in args.competitions if competition not in COMPETITIONS]
+    if unknown:
+        parser.error(f"unknown competition(s): {', '.join(unknown)}")
+    if args.workers < 1 or args.season_workers < 1:
+        parser.error("--workers and --season-workers must be at least 1")
+
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.memory_budget is not None:
+        memory_budget = int(args.memory_budget * 2**30)
+    else:
+        memory = physical_memory()
+        memory_budget = int(memory * DEFAULT_MEMORY_FRACTION) if memory else None
+
+    # keep the stage order of the pipeline whatever the order on the command line
+    stages = [stage for stage in STAGES if stage in args.stages]
+    # same competition twice would write the same database concurrently
+    competitions = list(dict.fromkeys(args.competitions))
+
+    started_at = datetime.now().isoformat(timespec="seconds")
+    start = time.perf_counter()
+
+    results = run_all(
+        competitions,
+        stages=stages,
+        workers=args.workers,
+        memory_budget=memory_budget,
+        season_workers=args.season_workers,
+        instrument=args.instrument,
+        profile_match_id=args.profile_match
+    )
+
+    summary = {
+        "started_at": started_at,
+        "wall_time": round(time.perf_counter() - start, 3),
+        "workers": args.workers,
+        "season_workers": args.season_workers,
+        "memory_budget": memory_budget,
+        "stages": stages,
+        "competitions": results
+    }
+    write_summary(summary, args.summary)
+    print_summary(summary)
+    print(f"Run summary written to {args.summary}")
+
+    return 0 if all(result["status"] == "ok" for result in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
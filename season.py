@@ -0,0 +1,272 @@
+import shutil
+import signal
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from multiprocessing import Pool
+
+import instrumentation
+from event_cache import event_source_hash
+from graph_store import GraphStore
+from match_to_graphStats import graph_fingerprint, match_statistics, matches_statistics, metric_set
+from metrics_cache import cache_key
+
+
+# Matches sent to a worker at a time (their graphs are computed as one batch)
+SEASON_CHUNK_SIZE = 8
+
+# Graph store opened (memory mapped) once by every worker process
+_worker_store = None
+
+
+def _init_worker(store_directory, instrumentation_settings):
+    global _worker_store
+    # Ctrl-C is handled by the parent: it commits the finished matches and stops the pool.
+    # SIGTERM keeps its default action (the parent's handler is inherited by forked workers),
+    # pool.terminate() stops the workers with it
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    _worker_store = GraphStore.load(store_directory, mmap_mode="r")
+    instrumentation.configure(**instrumentation_settings)
+    # forked workers start with a copy of the records buffered by the parent
+    instrumentation.drain()
+
+
+def _chunk_statistics(graph_store, chunk):
+    # Metrics of a chunk of matches, all its team-graphs computed as one batch:
+    # one (match_id, team_id, rows) entry per team-graph
+    graph_keys = [
+        (match_id, team_id)
+        for match_id, team_ids in chunk
+        for team_id in team_ids
+    ]
+    statistics = matches_statistics(graph_store, graph_keys)
+
+    return [
+        (match_id, team_id, rows)
+        for (match_id, team_id), rows in zip(graph_keys, statistics)
+    ]
+
+
+def _compute_chunk(chunk):
+    # the instrumentation records of the chunk go back with its results
+    return _chunk_statistics(_worker_store, chunk), instrumentation.drain()
+
+
+def season_jobs(matches):
+    # (match_id, [team ids]) for every match of the season
+    return [(match["wyId"], list(match["teamsData"].keys())) for match in matches]
+
+
+def pending_jobs(graph_store, jobs, stored_fingerprints):
+    # Keep only the (match, team) graphs that are new or whose pass network changed since it was stored.
+    # Returns the remaining jobs and the fingerprint of every graph to compute
+    fingerprints = {}
+    remaining = []
+
+    for match_id, team_ids in jobs:
+        todo = []
+        for team_id in team_ids:
+            fingerprint = graph_fingerprint(graph_store, match_id, team_id)
+            if stored_fingerprints.get((int(match_id), int(team_id))) != fingerprint:
+                fingerprints[(match_id, team_id)] = fingerprint
+                todo.append(team_id)
+
+        if todo:
+            remaining.append((match_id, todo))
+
+    return remaining, fingerprints
+
+
+def cached_jobs(jobs, fingerprints, keys, metrics_cache, writer):
+    # Write the graphs found in the metrics cache, return the jobs that still have to be computed
+    hits = metrics_cache.get_many(keys.values())
+    remaining = []
+
+    for match_id, team_ids in jobs:
+        todo = []
+        for team_id in team_ids:
+            cached = hits.get(keys[(match_id, team_id)])
+
+            if cached is not None and cached[1] == fingerprints[(match_id, team_id)]:
+                writer.add_match(match_id=match_id, team_id=team_id, rows=cached[0], fingerprint=cached[1])
+            else:
+                todo.append(team_id)
+
+        if todo:
+            remaining.append((match_id, todo))
+
+    return remaining
+
+
+@contextmanager
+def interrupt_on_sigterm():
+    # SIGTERM (e.g. the run being stopped by a scheduler) interrupts the season like Ctrl-C,
+    # so the finished matches are committed before exiting. Keep it around the close of the
+    # writer too: a SIGTERM with the default action there kills the owner before its last rows
+    if threading.current_thread() is not threading.main_thread():
+        yield
+        return
+
+    def interrupt(signum, frame):
+        raise KeyboardInterrupt
+
+    previous = signal.signal(signal.SIGTERM, interrupt)
+    try:
+        yield
+    finally:
+        signal.signal(signal.SIGTERM, previous)
+
+
+def compute_season(graph_store, matches, writer, workers=1, chunk_size=SEASON_CHUNK_SIZE,
+                   metrics_cache=None, competition=None):
+    # Compute the graph statistics of the season and send them to the writer.
+    # Matches already stored with the same pass networks are skipped, so rerunning a season only
+    # computes the new or changed matches (e.g. the last gameweek).
+    # With a metrics_cache, graphs computed in any earlier run (match or season mode) are
+    # taken from it and the new ones are added to it.
+    # With workers > 1 the matches are spread across a process pool: the workers read
+    # the edge lists from the memory-mapped store files and send back the player rows,
+    # which are written here in match order
+    all_jobs = season_jobs(matches)
+    stored_fingerprints = writer.stored_fingerprints()
+
+    profile_match_id = instrumentation.profile_match_id()
+    if profile_match_id is not None:
+        # the profiled match is always computed again
+        stored_fingerprints = {key: value for key, value in stored_fingerprints.items() if key[0] != profile_match_id}
+
+    jobs, fingerprints = pending_jobs(graph_store, all_jobs, stored_fingerprints)
+    profiled_jobs = [job for job in jobs if instrumentation.is_profiled(job[0])]
+    jobs = [job for job in jobs if not instrumentation.is_profiled(job[0])]
+
+    print(f"{len(all_jobs) - len(jobs) - len(profiled_jobs)} matches already up to date, {len(jobs) + len(profiled_jobs)} to compute")
+
+    keys = {}
+    if metrics_cache is not None and graph_store.source_hash is not None:
+        keys = {
+            (match_id, team_id): cache_key(competition, match_id, team_id, metric_set(), graph_store.source_hash)
+            for match_id, team_id in fingerprints
+        }
+        n_jobs = len(jobs)
+        jobs = cached_jobs(jobs, fingerprints, keys, metrics_cache, writer)
+        print(f"{n_jobs - len(jobs)} matches found in the metrics cache")
+
+    def write_results(chunk_results):
+        for match_id, team_id, rows in chunk_results:
+            writer.add_match(
+                match_id=match_id,
+                team_id=team_id,
+                rows=rows,
+                fingerprint=fingerprints[(match_id, team_id)]
+            )
+
+        if keys:
+            metrics_cache.put_many([
+                (keys[(match_id, team_id)], rows, fingerprints[(match_id, team_id)])
+                for match_id, team_id, rows in chunk_results
+            ])
+
+    instrumentation.start_run(mode="season", competition=competition, matches=len(all_jobs), workers=workers)
+    total = len(jobs) + len(profiled_jobs)
+
+    pool = None
+    store_directory = None
+
+    with interrupt_on_sigterm():
+        try:
+            # the profiled match runs alone, in this process
+            for job in profiled_jobs:
+                with instrumentation.profiled(job[0]):
+                    write_results(_chunk_statistics(graph_store, [job]))
+
+            if not jobs:
+                return total
+
+            chunks = [jobs[i:i + chunk_size] for i in range(0, len(jobs), chunk_size)]
+
+            if workers > 1:
+                # stores built from the events are already on disk,
+                # the others are saved in a temporary directory for the workers
+                shared_directory = graph_store.directory
+                if shared_directory is None:
+                    store_directory = tempfile.mkdtemp(prefix="graph_store_")
+                    graph_store.save(store_directory)
+                    shared_directory = store_directory
+
+                pool = Pool(
+                    workers,
+                    initializer=_init_worker,
+                    initargs=(shared_directory, instrumentation.settings())
+                )
+                results = pool.imap(_compute_chunk, chunks)
+            else:
+                results = ((_chunk_statistics(graph_store, chunk), []) for chunk in chunks)
+
+            done = len(profiled_jobs)
+            start = time.perf_counter()
+
+            for chunk, (chunk_results, records) in zip(chunks, results):
+                instrumentation.collect(records)
+                write_results(chunk_results)
+
+                done += len(chunk)
+                elapsed = time.perf_counter() - start
+                rate = (done - len(profiled_jobs)) / elapsed if elapsed > 0 else 0.0
+                print(f"computation {(done / total) * 100:.1f}% done ({done}/{total} matches, {rate:.2f} matches/s)")
+
+        except KeyboardInterrupt:
+            # the rows of the finished matches are committed below with their match_graphs entries:
+            # running the same command again resumes from the first match not committed
+            print("Interrupted, the finished matches are saved: run again to resume")
+            raise
+
+        finally:
+            if pool is not None:
+                # every result has been consumed (or the run failed), stop the workers
+                pool.terminate()
+                pool.join()
+            if store_directory is not None:
+                shutil.rmtree(store_directory, ignore_errors=True)
+
+            # write the pending rows now so that the run record counts them
+            writer.flush()
+            instrumentation.end_run(computed=total)
+
+    return total
+
+
+def compute_match(json_path, competition, match_id, team_ids, writer, metrics_cache):
+    # Graph statistics of a single match. Teams already computed in any earlier run
+    # (match or season mode) come straight from the metrics cache: only the cache meta
+    # file is read to identify the events source, the events themselves are not loaded.
+    # The profiled match (see instrumentation.py) is always computed
+    source_hash = event_source_hash(json_path)
+    graph_store = None
+
+    instrumentation.start_run(mode="match", competition=competition, match_id=int(match_id))
+
+    try:
+        with instrumentation.profiled(match_id):
+            for team_id in team_ids:
+                key = cache_key(competition, match_id, team_id, metric_set(), source_hash)
+                cached = None if instrumentation.is_profiled(match_id) else metrics_cache.get(key)
+
+                if cached is not None:
+                    rows, fingerprint = cached
+                    print(f"team {team_id}: metrics found in the cache")
+                else:
+                    if graph_store is None:
+                        graph_store = GraphStore.from_json(json_path)
+
+                    rows = match_statistics(graph_store, match_id, team_id)
+                    fingerprint = graph_fingerprint(graph_store, match_id, team_id)
+                    metrics_cache.put(key, rows, fingerprint)
+                    print(f"team {team_id}: metrics computed")
+
+                writer.add_match(match_id=match_id, team_id=team_id, rows=rows, fingerprint=fingerprint)
+
+    finally:
+        writer.flush()
+        instrumentation.end_run()
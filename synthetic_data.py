@@ -0,0 +1,332 @@
+import json
+import os
+import random
+from datetime import date, timedelta
+
+from data_paths import DATA_PATH, PLAYERS_PATH, TEAMS_PATH, events_path, matches_path
+
+
+# Synthetic competitions in the Wyscout schema (events, matches, players, teams),
+# laid out like the extracted Data/ directory so every script of the project can run on them.
+#
+#   python synthetic_data.py Synthetic 380 --root /tmp/synthetic
+
+# Same as the real leagues
+TEAMS_PER_COMPETITION = 20
+PLAYERS_PER_TEAM = 25
+BENCH_SIZE = 7
+SUBSTITUTIONS_PER_TEAM = 3
+
+# About the density of the real files (~1,700 events per match, half of them passes)
+EVENTS_PER_MATCH = 1700
+
+# Events of the team in possession: (eventId, eventName, [(subEventId, subEventName)], weight)
+POSSESSION_EVENTS = [
+    (8, "Pass", [(85, "Simple pass"), (83, "High pass"), (82, "Head pass"), (80, "Cross"),
+                 (86, "Smart pass"), (84, "Launch"), (81, "Hand pass")], 0.52),
+    (1, "Duel", [(11, "Ground attacking duel"), (12, "Ground defending duel"),
+                 (13, "Ground loose ball duel"), (10, "Air duel")], 0.28),
+    (7, "Others on the ball", [(72, "Touch"), (71, "Clearance"), (70, "Acceleration")], 0.10),
+    (10, "Shot", [(100, "Shot")], 0.015),
+    (2, "Foul", [(20, "Foul")], 0.02),
+    (5, "Interruption", [(50, "Ball out of the field"), (51, "Whistle")], 0.04),
+    (6, "Offside", [("", "")], 0.005)
+]
+
+# Restart after a foul or an interruption
+FREE_KICK = (3, "Free Kick", [(32, "Free Kick"), (36, "Throw in"), (31, "Corner"), (34, "Goal kick")])
+
+# Share of accurate passes (tag 1801), the ball changes team after an inaccurate one
+ACCURATE_PASS_RATE = 0.82
+
+ROLES = [
+    {"code2": "GK", "code3": "GKP", "name": "Goalkeeper"},
+    {"code2": "DF", "code3": "DEF", "name": "Defender"},
+    {"code2": "MD", "code3": "MID", "name": "Midfielder"},
+    {"code2": "FW", "code3": "FWD", "name": "Forward"}
+]
+
+# roles of the 25 players of a team
+ROSTER_ROLES = [0, 0, 0] + [1] * 8 + [2] * 8 + [3] * 6
+
+
+def team_id(competition_index, team_index):
+    return 10000 + 100 * competition_index + team_index
+
+
+def player_id(team, index):
+    return team * 100 + index
+
+
+def generate_teams(competition_index, n_teams):
+    return [
+        {
+            "wyId": team_id(competition_index, i),
+            "name": f"Team {team_id(competition_index, i)}",
+            "officialName": f"Synthetic Team {team_id(competition_index, i)}",
+            "city": f"City {i}",
+            "area": {"id": 0, "name": "Synthetic", "alpha2code": "XX", "alpha3code": "XXX"},
+            "type": "club"
+        }
+        for i in range(n_teams)
+    ]
+
+
+def generate_players(teams, rng):
+    players = []
+
+    for team in teams:
+        for i, role in enumerate(ROSTER_ROLES):
+            wy_id = player_id(team["wyId"], i)
+            players.append({
+                "wyId": wy_id,
+                "shortName": f"P. {wy_id}",
+                "firstName": f"First{wy_id}",
+                "middleName": "",
+                "lastName": f"Last{wy_id}",
+                "birthDate": (date(1985, 1, 1) + timedelta(days=rng.randrange(5000))).isoformat(),
+                "birthArea": {"id": 0, "name": "Synthetic"},
+                "passportArea": {"id": 0, "name": "Synthetic"},
+                "height": rng.randint(165, 198),
+                "weight": rng.randint(60, 95),
+                "foot": rng.choice(["right", "left", "both"]),
+                "role": ROLES[role],
+                "currentTeamId": team["wyId"],
+                "currentNationalTeamId": "null"
+            })
+
+    return players
+
+
+def fixtures(teams, n_matches):
+    # Double round robin as in a league season, repeated when more matches are asked
+    pairs = [(home, away) for home in teams for away in teams if home is not away]
+    return [pairs[i % len(pairs)] for i in range(n_matches)]
+
+
+def line_up(team, rng):
+    # 11 starters (one goalkeeper), bench and substitutions of one team
+    roster = [player_id(team["wyId"], i) for i in range(PLAYERS_PER_TEAM)]
+    goalkeepers = [roster[rng.randrange(3)]]
+    outfield = rng.sample(roster[3:], 10 + BENCH_SIZE - 1)
+
+    lineup = goalkeepers + outfield[:10]
+    bench = [roster[(roster.index(goalkeepers[0]) + 1) % 3]] + outfield[10:]
+
+    substitutions = [
+        {"playerIn": player_in, "playerOut": player_out, "minute": rng.randint(46, 88)}
+        for player_in, player_out in zip(rng.sample(bench[1:], SUBSTITUTIONS_PER_TEAM),
+                                         rng.sample(lineup[1:], SUBSTITUTIONS_PER_TEAM))
+    ]
+
+    return lineup, bench, substitutions
+
+
+def generate_match_events(match_id, teams_on_pitch, substitutions, n_events, rng, next_id):
+    # Events of one match: the team in possession keeps the ball until an inaccurate pass,
+    # a lost duel, a foul or an interruption; a player passes to a teammate on the pitch.
+    # Returns the events and the goals of every team
+    team_ids = list(teams_on_pitch)
+    goals = {team: 0 for team in team_ids}
+    on_pitch = {team: list(players) for team, players in teams_on_pitch.items()}
+
+    names = [event[:3] for event in POSSESSION_EVENTS]
+    weights = [event[3] for event in POSSESSION_EVENTS]
+
+    events = []
+    in_possession = rng.choice(team_ids)
+    restart = False
+
+    for period in ("1H", "2H"):
+        n_period = n_events // 2 if period == "1H" else n_events - n_events // 2
+        mean_gap = 2700.0 / n_period
+        event_sec = 0.0
+
+        for k in range(n_period):
+            event_sec += rng.expovariate(1.0 / mean_gap)
+
+            if period == "2H":
+                minute = 45 + event_sec / 60
+                for team in team_ids:
+                    for substitution in substitutions[team]:
+                        if substitution["minute"] <= minute and substitution["playerOut"] in on_pitch[team]:
+                            on_pitch[team][on_pitch[team].index(substitution["playerOut"])] = substitution["playerIn"]
+
+            team = in_possession
+            if restart:
+                event_id, event_name, sub_events = FREE_KICK
+                restart = False
+            else:
+                event_id, event_name, sub_events = rng.choices(names, weights)[0]
+            sub_event_id, sub_event_name = rng.choice(sub_events)
+
+            tags = []
+            if event_name == "Pass":
+                if rng.random() < ACCURATE_PASS_RATE:
+                    tags.append({"id": 1801})
+                else:
+                    tags.append({"id": 1802})
+                    in_possession = team_ids[1 - team_ids.index(team)]
+                if rng.random() < 0.002:
+                    tags.append({"id": 301})
+            elif event_name == "Shot":
+                if rng.random() < 0.1:
+                    tags.append({"id": 101})
+                    goals[team] += 1
+                in_possession = team_ids[1 - team_ids.index(team)]
+            elif event_name == "Duel":
+                won = rng.random() < 0.5
+                tags.append({"id": 703 if won else 701})
+                if not won:
+                    in_possession = team_ids[1 - team_ids.index(team)]
+            elif event_name == "Foul":
+                if rng.random() < 0.15:
+                    tags.append({"id": rng.choice([1702, 1702, 1702, 1701, 1703])})
+                in_possession = team_ids[1 - team_ids.index(team)]
+                restart = True
+            elif event_name in ("Interruption", "Offside"):
+                in_possession = team_ids[1 - team_ids.index(team)]
+                restart = event_name == "Interruption"
+
+            events.append({
+                "eventId": event_id,
+                "subEventName": sub_event_name,
+                "tags": tags,
+                "playerId": rng.choice(on_pitch[team]) if event_name != "Interruption" else 0,
+                "positions": [
+                    {"y": rng.randint(0, 100), "x": rng.randint(0, 100)},
+                    {"y": rng.randint(0, 100), "x": rng.randint(0, 100)}
+                ],
+                "matchId": match_id,
+                "eventName": event_name,
+                "teamId": team,
+                "matchPeriod": period,
+                "eventSec": event_sec,
+                "subEventId": sub_event_id,
+                "id": next_id + len(events)
+            })
+
+    return events, goals
+
+
+def write_json_array(path, items):
+    # Write an iterable of lists of json objects as one json array, without holding all of them
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("[")
+        first = True
+        for chunk in items:
+            for item in chunk:
+                f.write("\n" if first else ",\n")
+                f.write(json.dumps(item))
+                first = False
+        f.write("\n]")
+
+
+def generate_competition(competition, n_matches, root=".", seed=0, competition_index=0,
+                         n_teams=TEAMS_PER_COMPETITION, events_per_match=EVENTS_PER_MATCH):
+    # Write a synthetic competition under root/Data, at the paths of data_paths.py:
+    #   Events/events_{competition}.json, matches/matches_{competition}.json,
+    #   Players/players.json, Teams/teams.json
+    # Players and teams files are replaced, so generate every competition with its own competition_index
+    # in the same root to keep all of them. Returns the number of events written
+    rng = random.Random(f"{seed}-{competition}")
+    teams = generate_teams(competition_index, n_teams)
+    players = generate_players(teams, rng)
+
+    teams_path = os.path.join(root, TEAMS_PATH)
+    players_path = os.path.join(root, PLAYERS_PATH)
+
+    # players and teams of the competitions generated before in the same root
+    if os.path.exists(teams_path):
+        with open(teams_path, "r", encoding="utf-8") as f:
+            teams_ids = {team["wyId"] for team in teams}
+            teams = [team for team in json.load(f) if team["wyId"] not in teams_ids] + teams
+    if os.path.exists(players_path):
+        with open(players_path, "r", encoding="utf-8") as f:
+            player_ids = {player["wyId"] for player in players}
+            players = [player for player in json.load(f) if player["wyId"] not in player_ids] + players
+
+    write_json_array(teams_path, [teams])
+    write_json_array(players_path, [players])
+
+    competition_teams = teams[-n_teams:]
+    matches = []
+    n_events = 0
+
+    def match_events():
+        nonlocal n_events
+        kickoff = date(2017, 8, 19)
+
+        for i, (home, away) in enumerate(fixtures(competition_teams, n_matches)):
+            match_id = 2500000 + 10000 * competition_index + i
+            teams_data = {}
+            on_pitch = {}
+            substitutions = {}
+
+            for side, team in (("home", home), ("away", away)):
+                lineup, bench, team_substitutions = line_up(team, rng)
+                on_pitch[team["wyId"]] = lineup
+                substitutions[team["wyId"]] = team_substitutions
+                teams_data[str(team["wyId"])] = {
+                    "teamId": team["wyId"],
+                    "side": side,
+                    "hasFormation": 1,
+                    "coachId": 0,
+                    "formation": {
+                        "lineup": [{"playerId": player, "goals": "null", "ownGoals": "0", "yellowCards": "0", "redCards": "0"} for player in lineup],
+                        "bench": [{"playerId": player, "goals": "null", "ownGoals": "0", "yellowCards": "0", "redCards": "0"} for player in bench],
+                        "substitutions": team_substitutions
+                    }
+                }
+
+            events, goals = generate_match_events(match_id, on_pitch, substitutions, events_per_match, rng, n_events + 1)
+            n_events += len(events)
+
+            for team, score in goals.items():
+                teams_data[str(team)]["score"] = score
+                teams_data[str(team)]["scoreHT"] = 0
+
+            home_goals, away_goals = goals[home["wyId"]], goals[away["wyId"]]
+            matches.append({
+                "wyId": match_id,
+                "label": f"{home['name']} - {away['name']}, {home_goals} - {away_goals}",
+                "date": (kickoff + timedelta(days=7 * (i // (n_teams // 2)))).isoformat(),
+                "gameweek": i // (n_teams // 2) + 1,
+                "competitionId": competition_index,
+                "seasonId": 0,
+                "roundId": 0,
+                "status": "Played",
+                "duration": "Regular",
+                "winner": home["wyId"] if home_goals > away_goals else away["wyId"] if away_goals > home_goals else 0,
+                "venue": home["city"],
+                "referees": [],
+                "teamsData": teams_data
+            })
+
+            yield events
+
+    write_json_array(os.path.join(root, events_path(competition)), match_events())
+    write_json_array(os.path.join(root, matches_path(competition)), [matches])
+
+    return n_events
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Generate a synthetic competition in the Wyscout schema.")
+    parser.add_argument("competition")
+    parser.add_argument("matches", type=int)
+    parser.add_argument("--root", default=".", help="directory receiving the Data/ tree (default: current)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--index", type=int, default=0, help="competition index, keeps ids distinct across competitions")
+    parser.add_argument("--events-per-match", type=int, default=EVENTS_PER_MATCH)
+    args = parser.parse_args()
+
+    n_events = generate_competition(
+        args.competition, args.matches, root=args.root, seed=args.seed,
+        competition_index=args.index, events_per_match=args.events_per_match
+    )
+    print(f"{args.competition}: {args.matches} matches, {n_events} events written to {os.path.join(args.root, DATA_PATH)}")
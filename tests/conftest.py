@@ -0,0 +1,61 @@
+import json
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# The modules of the project are top level scripts: make them importable from the tests
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_paths import events_path, matches_path
+from graph_store import GraphStore
+from pass_network import PassNetwork
+from synthetic_data import generate_competition
+
+
+# Small synthetic competition shared by the tests (see synthetic_data.py)
+COMPETITION = "Test"
+N_MATCHES = 4
+EVENTS_PER_MATCH = 600
+
+# Largest difference accepted between a batched metric and its networkx reference
+TOLERANCE = 1e-9
+
+
+@pytest.fixture(scope="session")
+def competition_root(tmp_path_factory):
+    root = str(tmp_path_factory.mktemp("competition"))
+    generate_competition(COMPETITION, N_MATCHES, root=root, seed=1, events_per_match=EVENTS_PER_MATCH)
+    return root
+
+
+@pytest.fixture(scope="session")
+def json_path(competition_root):
+    return os.path.join(competition_root, events_path(COMPETITION))
+
+
+@pytest.fixture(scope="session")
+def matches(competition_root):
+    with open(os.path.join(competition_root, matches_path(COMPETITION)), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+@pytest.fixture(scope="session")
+def graph_store(json_path):
+    return GraphStore.from_json(json_path)
+
+
+@pytest.fixture(scope="session")
+def networks(graph_store):
+    # graphs of the competition, plus a graph with a dangling node and an empty one
+    small = PassNetwork.from_edges(np.array([1, 2, 2, 3]), np.array([2, 1, 3, 3]), np.array([4, 1, 2, 1]))
+    empty = PassNetwork.from_edges(np.array([], dtype=int), np.array([], dtype=int), np.array([], dtype=int))
+    return graph_store.networks(sorted(graph_store.keys())) + [small, empty]
+
+
+def assert_same_values(batched, reference):
+    # {node: value} of a batched engine and of its reference, same nodes and values within TOLERANCE
+    assert batched.keys() == reference.keys()
+    for node, value in reference.items():
+        assert batched[node] == pytest.approx(value, abs=TOLERANCE)
@@ -0,0 +1,16 @@
+import networkx as nx
+
+from centrality import batched_betweenness, batched_pagerank
+from conftest import assert_same_values
+
+
+# Batched centrality engines against networkx, on the graphs of the synthetic competition
+
+def test_pagerank(networks):
+    for network, pagerank in zip(networks, batched_pagerank(networks)):
+        assert_same_values(pagerank, nx.pagerank(network.to_networkx(), weight="weight") if len(network) else {})
+
+
+def test_betweenness(networks):
+    for network, betweenness in zip(networks, batched_betweenness(networks)):
+        assert_same_values(betweenness, nx.betweenness_centrality(network.to_networkx(), weight="weight"))
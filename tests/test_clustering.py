@@ -0,0 +1,14 @@
+import networkx as nx
+import pytest
+
+from clustering import batched_clustering
+from conftest import assert_same_values
+
+
+# Batched weighted clustering against networkx, on the graphs of the synthetic competition
+
+@pytest.mark.parametrize("directed", [False, True])
+def test_clustering(networks, directed):
+    for network, clustering in zip(networks, batched_clustering(networks, directed=directed)):
+        G = network.to_networkx()
+        assert_same_values(clustering, nx.clustering(G if directed else G.to_undirected(), weight="weight"))
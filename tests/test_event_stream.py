@@ -0,0 +1,62 @@
+import io
+import json
+import random
+
+import numpy as np
+import pytest
+
+from event_stream import group_by_match, iter_json_array, iter_json_file
+from graph_store import GraphStore
+
+
+MIXED_ARRAY = [12345, 678, -0.5, 1e-7, True, None, "text, with [brackets]", {"id": 1801, "tags": [{"id": 703}]}, [], 42]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 7])
+def test_elements_cut_by_chunks(chunk_size):
+    text = json.dumps(MIXED_ARRAY)
+    assert list(iter_json_array(io.StringIO(text), chunk_size=chunk_size)) == MIXED_ARRAY
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 7])
+def test_number_at_end_of_array(chunk_size):
+    assert list(iter_json_array(io.StringIO(" [ 12345 , 678 ] "), chunk_size=chunk_size)) == [12345, 678]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 7, 64])
+def test_random_array(chunk_size):
+    # same elements as json.loads, numbers of every length end up cut by the chunk boundaries
+    rng = random.Random(chunk_size)
+    items = [
+        {"id": rng.randrange(10 ** rng.randrange(1, 12)), "x": rng.uniform(-1e3, 1e3), "e": rng.random() * 1e-9,
+         "tags": [{"id": rng.randrange(100, 2000)} for _ in range(rng.randrange(3))]}
+        for _ in range(50)
+    ]
+    text = json.dumps(items, indent=rng.choice([None, 1]))
+
+    assert list(iter_json_array(io.StringIO(text), chunk_size=chunk_size)) == json.loads(text)
+
+
+def test_empty_array():
+    assert list(iter_json_array(io.StringIO("[]"), chunk_size=1)) == []
+
+
+def test_unterminated_array():
+    with pytest.raises(ValueError):
+        list(iter_json_array(io.StringIO("[1, 2"), chunk_size=2))
+
+
+def test_group_by_match(json_path):
+    events = list(iter_json_file(json_path))
+    groups = list(group_by_match(iter(events)))
+
+    assert [match_id for match_id, _ in groups] == list(dict.fromkeys(event["matchId"] for event in events))
+    assert [event for _, match_events in groups for event in match_events] == events
+
+
+def test_graph_store_from_stream(json_path, graph_store):
+    # graphs built one match at a time from the stream are the graphs built from the event cache
+    streamed = GraphStore.from_stream(iter_json_file(json_path))
+
+    assert streamed.keys() == graph_store.keys()
+    assert np.array_equal(streamed.edges, np.asarray(graph_store.edges))
@@ -0,0 +1,54 @@
+import numpy as np
+
+from event_stream import iter_json_file
+from graph_store import GraphStore
+from possession import ACCURATE_PASS_TAG
+from test_possession import reference_chains
+
+
+# Edge lists of the graph store against graphs built pass by pass from the events
+
+def reference_graphs(json_path):
+    # (matchId, teamId) -> {(passer, receiver): [pairs, pairs started by an accurate pass]},
+    # consecutive passes of a team paired inside their chain
+    events = list(iter_json_file(json_path))
+    previous = {}
+    graphs = {}
+
+    for event, chain in zip(events, reference_chains(events)):
+        if event["eventName"] != "Pass":
+            continue
+
+        key = (event["matchId"], event["teamId"])
+        accurate = any(tag["id"] == ACCURATE_PASS_TAG for tag in event["tags"])
+
+        if key in previous and previous[key][1] == chain:
+            passer, _, passer_accurate = previous[key]
+            counts = graphs.setdefault(key, {}).setdefault((passer, event["playerId"]), [0, 0])
+            counts[0] += 1
+            counts[1] += passer_accurate
+
+        previous[key] = (event["playerId"], chain, accurate)
+
+    return graphs
+
+
+def edge_counts(network):
+    G = network.to_networkx()
+    return {(u, v): data["weight"] for u, v, data in G.edges(data=True)}
+
+
+def test_graph_store(json_path, graph_store):
+    reference = reference_graphs(json_path)
+    assert set(graph_store.keys()) == set(reference)
+
+    for (match_id, team_id), edges in reference.items():
+        assert edge_counts(graph_store.network(match_id, team_id)) == {edge: counts[0] for edge, counts in edges.items()}
+        assert edge_counts(graph_store.network(match_id, team_id, weight="completed")) == {
+            edge: counts[1] for edge, counts in edges.items() if counts[1]
+        }
+
+    # a second load maps the saved store
+    reloaded = GraphStore.from_json(json_path)
+    assert reloaded.keys() == graph_store.keys()
+    assert np.array_equal(np.asarray(reloaded.edges), np.asarray(graph_store.edges))
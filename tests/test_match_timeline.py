@@ -0,0 +1,73 @@
+import networkx as nx
+import pytest
+
+from conftest import assert_same_values
+from event_cache import open_event_cache
+from match_timeline import CLOCK_COLUMN, match_passes, window_centrality
+from pass_network import sliding_pass_networks
+from possession import CHAIN_COLUMN
+
+
+# Sliding window networks of the match timeline against networks rebuilt from the passes of every window
+
+WINDOW = 300
+STEP = 60
+
+
+@pytest.fixture(scope="module")
+def team_passes(json_path, matches):
+    # passes of every team of every match, in event order
+    cache = open_event_cache(json_path)
+    team_passes = []
+
+    for match in matches:
+        passes = match_passes(cache, match["wyId"])
+        for team_id in match["teamsData"].keys():
+            team_passes.append(passes[passes["teamId"] == int(team_id)].reset_index(drop=True))
+
+    return team_passes
+
+
+def window_edges(passes, start, end):
+    # {(passer, receiver): pairs} of the consecutive passes of a chain, dated at the first pass
+    edges = {}
+    rows = list(zip(passes["playerId"], passes[CLOCK_COLUMN], passes[CHAIN_COLUMN]))
+
+    for (passer, clock, chain), (receiver, _, next_chain) in zip(rows, rows[1:]):
+        if chain == next_chain and start <= clock < end:
+            edges[(passer, receiver)] = edges.get((passer, receiver), 0) + 1
+
+    return edges
+
+
+def test_sliding_pass_networks(team_passes):
+    for passes in team_passes:
+        windows = list(sliding_pass_networks(passes, WINDOW, STEP, clock_column=CLOCK_COLUMN, chain_column=CHAIN_COLUMN))
+        # no pair is left after the last window
+        assert window_edges(passes, windows[-1][1], float("inf")) == {}
+
+        for start, end, network in windows:
+            edges = window_edges(passes, start, end)
+            G = network.to_networkx()
+
+            assert {(u, v): data["weight"] for u, v, data in G.edges(data=True)} == edges
+            assert set(network.nodes()) == {player_id for edge in edges for player_id in edge}
+
+
+def test_window_pagerank(team_passes):
+    # PageRank of every window started from the scores of the previous one, as networkx does with nstart
+    for passes in team_passes:
+        timeline = window_centrality(passes, WINDOW, STEP)
+        previous = {}
+
+        for start, end, network in sliding_pass_networks(passes, WINDOW, STEP, clock_column=CLOCK_COLUMN, chain_column=CHAIN_COLUMN):
+            window = timeline[timeline["end"] == end]
+            players = network.nodes()
+            reference = {}
+
+            if players:
+                nstart = {player_id: previous.get(player_id, 1.0 / len(players)) for player_id in players}
+                reference = nx.pagerank(network.to_networkx(), weight="weight", nstart=nstart)
+
+            assert_same_values(dict(zip(window["player_id"], window["pagerank"])), reference)
+            previous = reference
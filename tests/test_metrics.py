@@ -0,0 +1,58 @@
+import networkx as nx
+import numpy as np
+import pytest
+
+import match_to_graphStats
+from conftest import assert_same_values
+from match_to_graphStats import graphs_statistics
+from metrics import METRIC_NAMES, compute_metrics
+from pass_network import PassNetwork
+
+
+# Metrics of the registry against networkx, and the two backends of match_to_graphStats against each other
+
+# Path 2 -> 1 -> (3, 4): the eigenvector power iteration does not converge in 100 iterations
+UNCONVERGED = PassNetwork.from_edges(np.array([1, 1, 2]), np.array([3, 4, 1]), np.array([1, 3, 4]))
+
+REFERENCES = {
+    "closeness": lambda G: nx.closeness_centrality(G, distance="weight"),
+    "harmonic": lambda G: nx.harmonic_centrality(G, distance="weight"),
+    "eigenvector": lambda G: nx.eigenvector_centrality(G, weight="weight") if len(G) else {}
+}
+
+
+@pytest.mark.parametrize("name", list(REFERENCES))
+def test_metric(networks, name):
+    values = compute_metrics(networks, [name])[0][name]
+    for network, network_values in zip(networks, values):
+        assert_same_values(dict(zip(network.nodes(), network_values.tolist())), REFERENCES[name](network.to_networkx()))
+
+
+def test_unconverged_eigenvector(monkeypatch):
+    # both backends warn and store the last iterate of the power iteration
+    with pytest.raises(nx.PowerIterationFailedConvergence):
+        nx.eigenvector_centrality(UNCONVERGED.to_networkx(), weight="weight")
+
+    statistics = {}
+    for backend in ["batched", "networkx"]:
+        monkeypatch.setattr(match_to_graphStats, "METRICS_BACKEND", backend)
+        with pytest.warns(RuntimeWarning, match="not converged"):
+            statistics[backend] = graphs_statistics([UNCONVERGED])[0]
+
+    eigenvector = 1 + METRIC_NAMES.index("eigenvector")
+    assert [row[0] for row in statistics["networkx"]] == [row[0] for row in statistics["batched"]]
+    assert [row[eigenvector] for row in statistics["networkx"]] == pytest.approx(
+        [row[eigenvector] for row in statistics["batched"]], abs=1e-12
+    )
+
+
+def test_backends(networks, monkeypatch):
+    # every metric of every graph, same rows with both backends
+    statistics = {}
+    for backend in ["batched", "networkx"]:
+        monkeypatch.setattr(match_to_graphStats, "METRICS_BACKEND", backend)
+        statistics[backend] = graphs_statistics(networks)
+
+    for batched, reference in zip(statistics["batched"], statistics["networkx"]):
+        assert [row[0] for row in batched] == [row[0] for row in reference]
+        assert np.allclose([row[1:] for row in batched], [row[1:] for row in reference], rtol=0, atol=1e-9)
@@ -0,0 +1,54 @@
+import numpy as np
+
+from event_cache import open_event_cache
+from event_stream import iter_json_file
+from possession import (
+    ACCURATE_PASS_TAG,
+    CONTESTED_EVENTS,
+    INTERRUPTION_EVENTS,
+    RESTART_EVENTS,
+    event_chains,
+    possession_chains,
+    stream_chains
+)
+
+
+# Vectorized possession chains against an event by event implementation of the rules
+
+def reference_chains(events):
+    # Chain id of every event, one event at a time (rules of possession.py)
+    chains = []
+    chain = -1
+    period = None
+    last_team = None
+    possession = None
+    stop = False
+
+    for event in events:
+        new_period = (event["matchId"], event["matchPeriod"]) != period
+        if new_period:
+            period = (event["matchId"], event["matchPeriod"])
+            last_team = None
+
+        if event["eventName"] not in CONTESTED_EVENTS:
+            last_team = event["teamId"]
+        team = event["teamId"] if last_team is None else last_team
+
+        if new_period or team != possession or stop or event["eventName"] in RESTART_EVENTS:
+            chain += 1
+        chains.append(chain)
+
+        accurate = any(tag["id"] == ACCURATE_PASS_TAG for tag in event["tags"])
+        stop = event["eventName"] in INTERRUPTION_EVENTS or (event["eventName"] == "Pass" and not accurate)
+        possession = team
+
+    return chains
+
+
+def test_possession_chains(json_path):
+    cache = open_event_cache(json_path)
+    reference = reference_chains(iter_json_file(json_path))
+
+    assert possession_chains(cache).tolist() == reference
+    assert np.asarray(event_chains(cache)).tolist() == reference
+    assert stream_chains(list(iter_json_file(json_path))).tolist() == reference
@@ -0,0 +1,99 @@
+import sqlite3
+from collections import Counter
+
+import pytest
+
+from conftest import COMPETITION
+from database import GraphStatisticWriter
+from ingestion import Ingestion
+from metrics_cache import MetricsCache
+from season import compute_season
+
+
+# Season runs of the synthetic competition: the stored tables do not depend on how they were computed
+
+
+def database_rows(path):
+    # Rows of the graph tables, in a fixed order
+    connection = sqlite3.connect(path)
+    try:
+        return {
+            table: connection.execute(f"SELECT * FROM {table} ORDER BY 1, 2, 3").fetchall()
+            for table in ["match_graphs", "match_node_data"]
+        } | {"node_data": connection.execute("SELECT * FROM node_data ORDER BY 1").fetchall()}
+    finally:
+        connection.close()
+
+
+def run_season(path, graph_store, matches, writer_class=GraphStatisticWriter, **kwargs):
+    # Season written to the database at path, returns the number of graphs computed and the rows
+    with writer_class(f"sqlite:///{path}") as writer:
+        computed = compute_season(graph_store, matches, writer, competition=COMPETITION, **kwargs)
+    return computed, database_rows(path)
+
+
+def test_season_rows(tmp_path, graph_store, matches):
+    computed, rows = run_season(tmp_path / "season.db", graph_store, matches)
+
+    assert computed == len(matches)
+    assert len(rows["node_data"]) > 0
+    # one row per player of every graph
+    assert Counter(row[2] for row in rows["match_node_data"]) == Counter(
+        player_id
+        for match_id, team_id in graph_store.keys()
+        for player_id in graph_store.network(match_id, team_id).nodes()
+    )
+
+
+def test_metrics_cache(tmp_path, graph_store, matches):
+    # a second database filled from the metrics cache holds the rows computed for the first one
+    with MetricsCache(str(tmp_path / "metrics_cache.db")) as metrics_cache:
+        computed, rows = run_season(tmp_path / "computed.db", graph_store, matches, metrics_cache=metrics_cache)
+        cached_computed, cached_rows = run_season(tmp_path / "cached.db", graph_store, matches, metrics_cache=metrics_cache)
+
+    assert computed == len(matches)
+    assert cached_computed == 0
+    assert cached_rows == rows
+
+
+def test_ingestion_writer(tmp_path, graph_store, matches):
+    # the writer process stores what the writer stores in process
+    _, rows = run_season(tmp_path / "direct.db", graph_store, matches)
+    _, ingested_rows = run_season(tmp_path / "ingested.db", graph_store, matches, writer_class=Ingestion)
+
+    assert ingested_rows == rows
+
+
+class InterruptedWriter(GraphStatisticWriter):
+    # Writer interrupted (Ctrl-C) when the season sends it the graph after the first n_graphs
+    n_graphs = 3
+
+    def add_match(self, match_id, team_id, rows, fingerprint=None):
+        if self.n_graphs == 0:
+            raise KeyboardInterrupt
+        self.n_graphs -= 1
+        super().add_match(match_id, team_id, rows, fingerprint)
+
+
+def test_resumed_season(tmp_path, graph_store, matches):
+    # a season interrupted and run again stores what an uninterrupted run stores
+    _, rows = run_season(tmp_path / "uninterrupted.db", graph_store, matches)
+
+    path = tmp_path / "resumed.db"
+    with pytest.raises(KeyboardInterrupt):
+        run_season(path, graph_store, matches, writer_class=InterruptedWriter, chunk_size=1)
+    interrupted_rows = database_rows(path)
+    computed, resumed_rows = run_season(path, graph_store, matches, chunk_size=1)
+
+    assert 0 < len(interrupted_rows["match_graphs"]) < len(rows["match_graphs"])
+    assert 0 < computed < len(matches)
+    assert resumed_rows == rows
+
+
+@pytest.mark.parametrize("workers", [2, 3])
+def test_season_workers(tmp_path, graph_store, matches, workers):
+    # the process pool stores what the single process run stores
+    _, rows = run_season(tmp_path / "single.db", graph_store, matches)
+    _, pool_rows = run_season(tmp_path / "pool.db", graph_store, matches, workers=workers, chunk_size=1)
+
+    assert pool_rows == rows